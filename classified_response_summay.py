@@ -1,77 +1,93 @@
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
+from dash import Dash, dcc, html, callback_context
+from dash.dependencies import Input, Output, State
+import numpy as np
 import pandas as pd
 from urllib.parse import parse_qs, unquote, quote
+import data_store
+import layout_cache
+import rowspan_table
 
-# 读取数据
-df = pd.read_csv("./classified_response_summaries2.csv")
-
-# 处理主表：去重 Category + Groups
-df_main = df[['Category', 'Groups']].drop_duplicates().reset_index(drop=True)
-df_main["RowSpan"] = df_main.groupby("Category")["Groups"].transform("count")
+# 数据由共享的 data_store 提供，每次请求时读取，以便数据热更新
+DATASET = "classified_response"
 
 # 初始化 Dash
 app = Dash(__name__)
 app.config.suppress_callback_exceptions = True
 
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    html.Div(id='page-content')
-])
-
 # 主页面布局（关键修改点：添加 target="_blank"）
-main_layout = html.Div([
-    html.H1("Response Summary Dashboard", style={'textAlign': 'center', 'margin': '20px'}),
-    html.Div([
-        html.Table(
-            id="main_table",
-            style={'width': '80%', 'margin': 'auto', 'borderCollapse': 'collapse', 'border': '1px solid #ddd'},
-            children=[
-                html.Thead(html.Tr([
-                    html.Th("Category",
-                            style={'backgroundColor': '#f8f9fa', 'padding': '12px', 'border': '1px solid #ddd',
-                                   'textAlign': 'center'}),
-                    html.Th("Groups",
-                            style={'backgroundColor': '#f8f9fa', 'padding': '12px', 'border': '1px solid #ddd',
-                                   'textAlign': 'left'})
-                ])),
-                html.Tbody(id="table_body")
-            ]
-        )
+# 主表第一页直接渲染进页面，每个数据版本只生成一次
+def build_main_layout(dataset):
+    rows, _, label = rowspan_table.main_page(dataset, main_columns)
+    return html.Div([
+        html.H1("Response Summary Dashboard", style={'textAlign': 'center', 'margin': '20px'}),
+        html.Div([
+            html.Table(
+                id="main_table",
+                style={'width': '80%', 'margin': 'auto', 'borderCollapse': 'collapse', 'border': '1px solid #ddd'},
+                children=[
+                    html.Thead(html.Tr([
+                        html.Th("Category",
+                                style={'backgroundColor': '#f8f9fa', 'padding': '12px', 'border': '1px solid #ddd',
+                                       'textAlign': 'center'}),
+                        html.Th("Groups",
+                                style={'backgroundColor': '#f8f9fa', 'padding': '12px', 'border': '1px solid #ddd',
+                                       'textAlign': 'left'})
+                    ])),
+                    html.Tbody(rows, id="table_body")
+                ]
+            ),
+            # 主表分页，每次只发送一页
+            rowspan_table.pager(label)
+        ])
     ])
-])
 
 
-# 详情页面布局（保持不变）
+# 应用布局：页面内容由 display_page 按 URL 填充
+app.layout = layout_cache.app_layout()
+
+
+# 主表列：Category 合并单元格，Groups 链接到详情页（新标签页打开）
+main_columns = [
+    {"column": "Category", "merge": True,
+     "style": {'textAlign': 'center', 'verticalAlign': 'middle', 'padding': '12px',
+               'border': '1px solid #ddd', 'backgroundColor': '#f8f9fa'}},
+    {"column": "Groups", "style": {'border': '1px solid #ddd'},
+     "render": lambda row: dcc.Link(
+         row["Groups"],
+         href=f"/detail?category={quote(row['Category'])}&group={quote(row['Groups'])}",
+         target="_blank",
+         style={'color': '#007bff', 'textDecoration': 'none', 'display': 'block', 'padding': '10px'}
+     )},
+]
+
+# 详情表列：相同 Summary 的回复合并 Summary 单元格
+detail_columns = [
+    {"column": "Summary", "merge": True,
+     "style": {'textAlign': 'center', 'verticalAlign': 'middle', 'border': '1px solid #ddd',
+               'padding': '10px', 'backgroundColor': '#f8f9fa'}},
+    {"column": "Response", "style": {'border': '1px solid #ddd', 'padding': '10px'}},
+    {"column": "Upvotes", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
+                                    'color': '#28a745'}},
+    {"column": "Downvotes", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
+                                      'color': '#dc3545'}},
+]
+
+
+# 按 Upvotes 降序，同一 Summary 的回复排在一起（按其最高票数排序），便于合并单元格
+def sorted_group(dataset, category, group):
+    filtered_df = dataset.group(category, group).sort_values('Upvotes', ascending=False, kind='stable')
+    summary_rank = pd.factorize(filtered_df["Summary"])[0]
+    return filtered_df.iloc[np.argsort(summary_rank, kind='stable')]
+
+
+# 详情页面布局
 def detail_layout(category, group):
-    filtered_df = df[(df["Category"] == category) & (df["Groups"] == group)].sort_values('Upvotes', ascending=False)
-    summary_counts = filtered_df.groupby("Summary").size().reset_index(name='Count')
-    merged_data = pd.merge(filtered_df, summary_counts, on="Summary")
-
-    rows = []
-    current_summary = None
-    for index, row in merged_data.iterrows():
-        if row["Summary"] != current_summary:
-            current_summary = row["Summary"]
-            rowspan = row["Count"]
-            rows.append(html.Tr([
-                html.Td(current_summary, rowSpan=rowspan,
-                        style={'textAlign': 'center', 'verticalAlign': 'middle', 'border': '1px solid #ddd',
-                               'padding': '10px', 'backgroundColor': '#f8f9fa'}),
-                html.Td(row["Response"], style={'border': '1px solid #ddd', 'padding': '10px'}),
-                html.Td(row["Upvotes"], style={'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
-                                               'color': '#28a745'}),
-                html.Td(row["Downvotes"], style={'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
-                                                 'color': '#dc3545'})
-            ]))
-        else:
-            rows.append(html.Tr([
-                html.Td(row["Response"], style={'border': '1px solid #ddd', 'padding': '10px'}),
-                html.Td(row["Upvotes"], style={'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
-                                               'color': '#28a745'}),
-                html.Td(row["Downvotes"], style={'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center',
-                                                 'color': '#dc3545'})
-            ]))
+    # 表格行按数据版本缓存
+    dataset = data_store.get_dataset(DATASET)
+    rows = rowspan_table.cached_rows(
+        (DATASET, dataset.version, "detail", (category, group)),
+        lambda: rowspan_table.table_rows(sorted_group(dataset, category, group), detail_columns)
+    )
 
     return html.Div([
         dcc.Link("🔙 Back to Main", href="/",
@@ -106,50 +122,25 @@ def display_page(pathname, search):
         category = unquote(params.get('category', [None])[0])
         group = unquote(params.get('group', [None])[0])
         return detail_layout(category, group) if category and group else html.Div("Invalid Request")
-    return main_layout
+    return layout_cache.main_layout(DATASET, build_main_layout)
 
 
 # 生成主表内容（关键修改点：添加 target="_blank"）
 @app.callback(
-    Output("table_body", "children"),
-    [Input('url', 'pathname')]
+    [Output("table_body", "children"),
+     Output("table-page", "data"),
+     Output("page-label", "children")],
+    [Input('page-prev', 'n_clicks'),
+     Input('page-next', 'n_clicks')],
+    [State('table-page', 'data')],
+    prevent_initial_call=True
 )
-def update_table_body(_):
-    rows = []
-    current_category = None
-    for index, row in df_main.iterrows():
-        category, group = row["Category"], row["Groups"]
-        if category != current_category:
-            current_category = category
-            rowspan = int(row["RowSpan"])
-            rows.append(html.Tr([
-                html.Td(category, rowSpan=rowspan,
-                        style={'textAlign': 'center', 'verticalAlign': 'middle', 'padding': '12px',
-                               'border': '1px solid #ddd', 'backgroundColor': '#f8f9fa'}),
-                html.Td(
-                    dcc.Link(
-                        group,
-                        href=f"/detail?category={quote(category)}&group={quote(group)}",
-                        target="_blank",  # 新增此行实现新标签页打开
-                        style={'color': '#007bff', 'textDecoration': 'none', 'display': 'block', 'padding': '10px'}
-                    ),
-                    style={'border': '1px solid #ddd'}
-                )
-            ]))
-        else:
-            rows.append(html.Tr([
-                html.Td(
-                    dcc.Link(
-                        group,
-                        href=f"/detail?category={quote(category)}&group={quote(group)}",
-                        target="_blank",  # 新增此行
-                        style={'color': '#007bff', 'textDecoration': 'none', 'display': 'block', 'padding': '10px'}
-                    ),
-                    style={'border': '1px solid #ddd'}
-                )
-            ]))
-    return rows
-
+def update_table_body(prev_clicks, next_clicks, page):
+    # 主表（去重 Category + Groups）由 data_store 预先生成；只生成当前页的行，按数据版本和页码缓存
+    # 第一页随主页面预渲染，此回调只在翻页时运行
+    dataset = data_store.get_dataset(DATASET)
+    page = rowspan_table.turn_page(callback_context.triggered_id, page)
+    return rowspan_table.main_page(dataset, main_columns, page=page)
 
 if __name__ == "__main__":
     app.run_server(debug=True)
\ No newline at end of file
@@ -1,91 +1,115 @@
-from dash import Dash, dcc, html, dash_table
+from dash import Dash, dcc, html, dash_table, callback_context
 from dash.dependencies import Input, Output, State
-import pandas as pd
 from urllib.parse import parse_qs, unquote, quote
+import plotly.graph_objects as go
+import data_store
+import layout_cache
+import rowspan_table
 
-# 读取数据
-df = pd.read_csv("./conceptual_classified_responses.csv")
-
-# 处理主表：去重 Open Location Code + Category
-df_main = df[['Open Location Code', 'Category']].drop_duplicates().reset_index(drop=True)
-
-# 计算每个 Open Location Code 的出现次数，用于合并单元格
-df_main["RowSpan"] = df_main.groupby("Open Location Code")["Category"].transform("count")
+# 数据由共享的 data_store 提供，每次请求时读取，以便数据热更新
+DATASET = "conceptual_responses"
 
 # 初始化 Dash
 app = Dash(__name__)
 app.config.suppress_callback_exceptions = True  # 允许动态布局
 
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    html.Div(id='page-content')
-])
-
-# 主页面布局
-main_layout = html.Div([
-    html.H1("Conceptual Classified Responses", style={'textAlign': 'center'}),
-
-    # 添加搜索框（居中放置）
-    html.Div([
-        html.Label("Search Open Location Code:"),
-        dcc.Input(
-            id="search-input",
-            type="text",
-            placeholder="Enter Open Location Code...",
-            style={'marginLeft': '10px', 'padding': '5px', 'width': '300px'}
-        ),
-        html.Button(
-            "Search",
-            id="search-button",
-            style={
-                'marginLeft': '10px',
-                'padding': '5px 15px',
-                'backgroundColor': '#4CAF50',
-                'color': 'white',
-                'border': 'none',
-                'borderRadius': '4px',
-                'cursor': 'pointer'
-            }
-        )
-    ], style={'margin': '20px 0', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center'}),
-
-    html.Div(id="main_table_div", children=[
-        html.Table(
-            id="main_table",
-            style={'width': '100%', 'borderCollapse': 'collapse'},
-            children=[
-                html.Thead(
-                    html.Tr([
-                        html.Th("Open Location Code", style={
-                            'backgroundColor': 'lightgrey',
-                            'fontWeight': 'bold',
-                            'padding': '10px',
-                            'textAlign': 'center',
-                            'border': '1px solid #ddd'
-                        }),
-                        html.Th("Category", style={
-                            'backgroundColor': 'lightgrey',
-                            'fontWeight': 'bold',
-                            'padding': '10px',
-                            'textAlign': 'left',
-                            'border': '1px solid #ddd'
-                        })
-                    ])
-                ),
-                html.Tbody(id="table_body")
-            ]
-        )
+# 主页面布局：主表第一页直接渲染进页面，每个数据版本只生成一次
+def build_main_layout(dataset):
+    rows, _, label = rowspan_table.main_page(dataset, main_columns, empty_message="No matching records found")
+    return html.Div([
+        html.H1("Conceptual Classified Responses", style={'textAlign': 'center'}),
+
+        # 添加搜索框（居中放置）
+        html.Div([
+            html.Label("Search Open Location Code:"),
+            dcc.Input(
+                id="search-input",
+                type="text",
+                placeholder="Enter Open Location Code prefix, e.g. 85QFMC...",
+                style={'marginLeft': '10px', 'padding': '5px', 'width': '300px'}
+            ),
+            html.Button(
+                "Search",
+                id="search-button",
+                style={
+                    'marginLeft': '10px',
+                    'padding': '5px 15px',
+                    'backgroundColor': '#4CAF50',
+                    'color': 'white',
+                    'border': 'none',
+                    'borderRadius': '4px',
+                    'cursor': 'pointer'
+                }
+            )
+        ], style={'margin': '20px 0', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center'}),
+
+        # 搜索前缀所在区域的地点统计
+        html.Div(id="search-summary", style={'textAlign': 'center', 'color': '#555', 'marginBottom': '10px'}),
+
+        html.Div(id="main_table_div", children=[
+            html.Table(
+                id="main_table",
+                style={'width': '100%', 'borderCollapse': 'collapse'},
+                children=[
+                    html.Thead(
+                        html.Tr([
+                            html.Th("Open Location Code", style={
+                                'backgroundColor': 'lightgrey',
+                                'fontWeight': 'bold',
+                                'padding': '10px',
+                                'textAlign': 'center',
+                                'border': '1px solid #ddd'
+                            }),
+                            html.Th("Category", style={
+                                'backgroundColor': 'lightgrey',
+                                'fontWeight': 'bold',
+                                'padding': '10px',
+                                'textAlign': 'left',
+                                'border': '1px solid #ddd'
+                            })
+                        ])
+                    ),
+                    html.Tbody(rows, id="table_body")
+                ]
+            ),
+            # 主表分页，每次只发送一页
+            rowspan_table.pager(label, search=True)
+        ])
     ])
-])
+
+
+# 应用布局：页面内容由 display_page 按 URL 填充
+app.layout = layout_cache.app_layout()
+
+
+# 主表列：同一 OLC 合并单元格，Category 链接到详情页
+main_columns = [
+    {"column": "Open Location Code", "merge": True,
+     "style": {'textAlign': 'center', 'verticalAlign': 'middle', 'border': '1px solid #ddd', 'padding': '10px'}},
+    {"column": "Category", "style": {'border': '1px solid #ddd', 'padding': '10px'},
+     "render": lambda row: dcc.Link(
+         row["Category"],
+         href=f"/detail?olc={quote(row['Open Location Code'])}&category={quote(row['Category'])}",
+         target="_blank",
+         style={'textDecoration': 'none', 'color': '#0066cc'}
+     )},
+]
+
+# 详情表列：Category 合并单元格
+detail_columns = [
+    {"column": "Category", "merge": True,
+     "style": {'textAlign': 'center', 'verticalAlign': 'middle', 'border': '1px solid #ddd',
+               'padding': '10px', 'backgroundColor': '#f9f9f9'}},
+    {"column": "Idea Number", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center'}},
+    {"column": "Response", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'left'}},
+    {"column": "Upvotes", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center'}},
+    {"column": "Downvotes", "style": {'border': '1px solid #ddd', 'padding': '10px', 'textAlign': 'center'}},
+]
 
 
 # 详情页面布局
 def detail_layout(olc, category):
-    filtered_df = df[(df["Open Location Code"] == olc) & (df["Category"] == category)]
-
-    # 创建一个对Idea Number进行分组的数据结构，用于合并Category单元格
-    idea_groups = filtered_df.groupby("Idea Number")
-    idea_counts = idea_groups.size().reset_index(name='count')
+    dataset = data_store.get_dataset(DATASET)
 
     return html.Div([
         dcc.Link(
@@ -150,81 +174,54 @@ def detail_layout(olc, category):
                         })
                     ])
                 ),
-                html.Tbody(id="detail_table_body", children=generate_detail_rows(filtered_df, category))
+                html.Tbody(id="detail_table_body", children=generate_detail_rows(dataset, olc, category))
             ]
+        ),
+
+        # Open Location Code 对应的地图范围
+        dcc.Graph(
+            id='olc-map',
+            figure=create_olc_map(olc, dataset.olc_cell(olc)),
+            style={'height': '500px', 'margin': '20px', 'border': '1px solid #ddd', 'borderRadius': '5px'}
         )
     ])
 
 
-# 生成详情表格行的函数
-def generate_detail_rows(filtered_df, category):
-    rows = []
-    category_span = len(filtered_df)
-
-    for i, (_, row) in enumerate(filtered_df.iterrows()):
-        if i == 0:
-            # 第一行需要包含Category并设置rowSpan
-            tr = html.Tr([
-                html.Td(
-                    category,
-                    rowSpan=category_span,
-                    style={
-                        'textAlign': 'center',
-                        'verticalAlign': 'middle',
-                        'border': '1px solid #ddd',
-                        'padding': '10px',
-                        'backgroundColor': '#f9f9f9'
-                    }
-                ),
-                html.Td(row["Idea Number"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                }),
-                html.Td(row["Response"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'left'
-                }),
-                html.Td(row["Upvotes"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                }),
-                html.Td(row["Downvotes"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                })
-            ])
-        else:
-            # 后续行不包含Category
-            tr = html.Tr([
-                html.Td(row["Idea Number"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                }),
-                html.Td(row["Response"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'left'
-                }),
-                html.Td(row["Upvotes"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                }),
-                html.Td(row["Downvotes"], style={
-                    'border': '1px solid #ddd',
-                    'padding': '10px',
-                    'textAlign': 'center'
-                })
-            ])
-
-        rows.append(tr)
-
-    return rows
+# 地图生成函数：OLC 在数据加载时已解码，这里只需读取格子的边界
+def create_olc_map(olc, cell):
+    fig = go.Figure()
+    if cell is None:
+        fig.add_annotation(text="No valid data", showarrow=False)
+        return fig
+
+    fig.add_trace(go.Scattermapbox(
+        mode='lines',
+        fill='toself',
+        lon=[cell['west'], cell['east'], cell['east'], cell['west'], cell['west']],
+        lat=[cell['south'], cell['south'], cell['north'], cell['north'], cell['south']],
+        line=dict(width=3, color='#8338ec'),
+        fillcolor='rgba(131, 56, 236, 0.3)',
+        name=olc,
+        hoverinfo='text',
+        hovertext=f"OLC: {olc}"
+    ))
+    fig.update_layout(
+        mapbox=dict(
+            style="carto-positron",
+            zoom=18,
+            center=dict(lat=cell['lat'], lon=cell['lng'])
+        ),
+        margin={"r": 0, "t": 0, "l": 0, "b": 0}
+    )
+    return fig
+
+
+# 生成详情表格行的函数，按数据版本缓存
+def generate_detail_rows(dataset, olc, category):
+    return rowspan_table.cached_rows(
+        (DATASET, dataset.version, "detail", (olc, category)),
+        lambda: rowspan_table.table_rows(dataset.group(olc, category), detail_columns)
+    )
 
 
 # 页面路由回调
@@ -243,81 +240,53 @@ def display_page(pathname, search):
             return html.Div("Missing parameters")
 
         return detail_layout(olc, category)
-    else:
-        return main_layout
+    return layout_cache.main_layout(DATASET, build_main_layout)
 
 
 # 生成主表内容回调
 @app.callback(
-    Output("table_body", "children"),
-    [Input('url', 'pathname'),
-     Input("search-button", "n_clicks")],
-    [State("search-input", "value")]
+    [Output("table_body", "children"),
+     Output("search-summary", "children"),
+     Output("table-page", "data"),
+     Output("page-label", "children"),
+     Output("table-search", "data")],
+    [Input("search-button", "n_clicks"),
+     Input('page-prev', 'n_clicks'),
+     Input('page-next', 'n_clicks')],
+    [State("search-input", "value"),
+     State('table-page', 'data'),
+     State('table-search', 'data')],
+    prevent_initial_call=True
 )
-def update_table_body(_, search_clicks, search_value):
-    # 基于搜索值筛选数据
-    filtered_df_main = df_main
-    if search_value:
-        filtered_df_main = df_main[df_main["Open Location Code"].str.contains(search_value, case=False)]
-
-    rows = []
-    current_olc = None
-    rowspan_count = 0
-
-    for index, row in filtered_df_main.iterrows():
-        olc = row["Open Location Code"]
-        category = row["Category"]
-
-        if olc != current_olc:
-            current_olc = olc
-            # 由于过滤了数据，我们需要重新计算同一OLC的出现次数
-            rowspan_count = len(filtered_df_main[filtered_df_main["Open Location Code"] == olc])
-            tr = html.Tr([
-                html.Td(
-                    olc,
-                    rowSpan=rowspan_count,
-                    style={
-                        'textAlign': 'center',
-                        'verticalAlign': 'middle',
-                        'border': '1px solid #ddd',
-                        'padding': '10px'
-                    }
-                ),
-                html.Td(
-                    dcc.Link(
-                        category,
-                        href=f"/detail?olc={quote(olc)}&category={quote(category)}",
-                        target="_blank",
-                        style={'textDecoration': 'none', 'color': '#0066cc'}
-                    ),
-                    style={
-                        'border': '1px solid #ddd',
-                        'padding': '10px'
-                    }
-                )
-            ])
-        else:
-            tr = html.Tr(
-                html.Td(
-                    dcc.Link(
-                        category,
-                        href=f"/detail?olc={quote(olc)}&category={quote(category)}",
-                        target="_blank",
-                        style={'textDecoration': 'none', 'color': '#0066cc'}
-                    ),
-                    style={
-                        'border': '1px solid #ddd',
-                        'padding': '10px'
-                    }
-                )
-            )
-        rows.append(tr)
-
-    if not rows:
-        rows = [
-            html.Tr(html.Td("No matching records found", colSpan=2, style={'textAlign': 'center', 'padding': '20px'}))]
-
-    return rows
+def update_table_body(search_clicks, prev_clicks, next_clicks, search_input, page, applied):
+    # 主表（去重 Open Location Code + Category）由 data_store 预先生成
+    # 基于搜索值筛选数据：Plus code 是分层的，前缀即一个区域，在排序后的编码上二分查找
+    # 只生成当前页的行：合并行数在页内向量化计算，按数据版本、搜索值和页码缓存
+    # 第一页随主页面预渲染，此回调只在搜索和翻页时运行
+    # 翻页使用上次点击搜索时应用的搜索值，而不是输入框中之后修改过的值
+    dataset = data_store.get_dataset(DATASET)
+    search_value = rowspan_table.applied_search(callback_context.triggered_id, search_input, applied)
+    page = rowspan_table.turn_page(callback_context.triggered_id, page)
+    rows, page, label = rowspan_table.main_page(dataset, main_columns, search_value, page,
+                                                empty_message="No matching records found")
+    summary = search_summary(dataset, search_value)
+
+    return rows, summary, page, label, search_value
+
+
+# 前缀区域统计：地点数，以及按下一级网格细分的单元数
+def search_summary(dataset, search_value):
+    prefix = (search_value or "").strip().upper()
+    digits = prefix.replace("+", "")
+    if not digits:
+        return None
+    # 前 8 位按两位一级细分，之后按一位
+    length = len(digits) + (2 - len(digits) % 2 if len(digits) < 8 else 1)
+    cells = dataset.olc_rollup(length, prefix)
+    if cells is None or cells.empty:
+        return None
+    return (f"{prefix}: {int(cells['locations'].sum())} locations, "
+            f"{int(cells['rows'].sum())} location/category pairs in {len(cells)} sub-cells")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,674 @@
+"""
+Shared data access for the dashboard sub-apps
+---------------------------------------------
+Every survey CSV is ingested once into an immutable Arrow table (served from
+a binary snapshot on later starts, see ingest_cache), converted to a single
+pandas frame and handed out to the sub-apps as read-only views. Datasets
+with a WKT column also get a parsed "shape" column of shapely geometries,
+always in WGS84 lon/lat. main_app_ec2 calls load_all() at import time so
+that gunicorn (started with --preload) loads the data once in the master
+and the workers share it copy-on-write after fork.
+
+When a source CSV changes, the dataset is rebuilt in a background thread and
+swapped in atomically with a new version number (see start_watcher and
+reload_dataset), so the service never has to be restarted for new data.
+"""
+
+import codecs
+import csv
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import shapely
+
+import geo_ingest
+import geo_metrics
+import ingest_cache
+import plus_codes
+import search_index
+import spatial_index
+import text_search
+
+# Data files live next to this module, independent of the current directory
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Float measures are shown with two decimals; narrowing them must not change that
+FLOAT_DECIMALS = 2
+
+# Size of the blocks the CSVs are streamed in; bounds peak memory during ingest
+CHUNK_BYTES = int(os.environ.get('DASHBOARD_CHUNK_BYTES', 16 << 20))
+
+# Seconds between checks of the source files for changes (0 disables reloading)
+RELOAD_INTERVAL = float(os.environ.get('DASHBOARD_RELOAD_INTERVAL', '5'))
+
+# Touched by request_reload(); the watcher of every worker reloads all datasets when it changes
+RELOAD_MARKER = os.environ.get('DASHBOARD_RELOAD_MARKER', os.path.join(DATA_DIR, '.reload'))
+
+# Main-table searches remembered per dataset version, for paging
+SEARCH_CACHE_ENTRIES = 64
+
+# Survey datasets, keyed by the module_name of the sub-app that uses them
+DATASETS = {
+    "location_differences": {
+        "path": "output_location_differences.csv",
+        "encodings": ["cp1252", "utf-8"],
+        "numeric_columns": ["area", "shape_index"],
+        "categorical_columns": ["category", "sub", "OLCs", "geometry_issue"],
+        "geometry_column": "geometry",
+        "crs": "EPSG:3857",
+        "group_keys": ["category", "sub"],
+        # Query parameters of the sub-app's /detail page, one per group key
+        "detail_params": ["category", "sub"],
+        "olc_column": "OLCs",
+        "search_columns": ["category", "sub"],
+        # Free text behind the global search on the home page
+        "text_columns": ["response"],
+        # Planar measures shipped in the CSV (in its CRS), checked against the shapes
+        "shipped_metrics": {"area": "area", "shape_index": "shape_index"},
+        "flag_column": "wrong",
+    },
+    "classified_response": {
+        "path": "classified_response_summaries2.csv",
+        "encodings": ["utf-8"],
+        "numeric_columns": [],
+        # Vote counters: integers, stray text becomes missing
+        "count_columns": ["Upvotes", "Downvotes"],
+        "categorical_columns": ["Category", "Groups"],
+        "group_keys": ["Category", "Groups"],
+        "detail_params": ["category", "group"],
+        "text_columns": ["Summary", "Response"],
+    },
+    "conceptual_responses": {
+        "path": "conceptual_classified_responses.csv",
+        "encodings": ["utf-8"],
+        "numeric_columns": [],
+        "count_columns": ["Upvotes", "Downvotes"],
+        # Other columns always read as text, however they look
+        "string_columns": ["Idea Number"],
+        "categorical_columns": ["Open Location Code", "Category"],
+        "group_keys": ["Open Location Code", "Category"],
+        "detail_params": ["olc", "category"],
+        "olc_column": "Open Location Code",
+        # Searched by plus code prefix rather than substring
+        "prefix_search_column": "Open Location Code",
+        "text_columns": ["Response"],
+    },
+    "different_place": {
+        "path": "different_place_for_sameidea2.csv",
+        "encodings": ["utf-8"],
+        "numeric_columns": [],
+        "categorical_columns": ["Category", "Groups", "OLCs", "geometry_issue"],
+        "geometry_column": "geometry",
+        "crs": "EPSG:4326",
+        "group_keys": ["Category", "Groups"],
+        "detail_params": ["category", "group"],
+        "olc_column": "OLCs",
+        "text_columns": ["Summary", "Keywords"],
+    },
+}
+
+
+class Dataset:
+    """One loaded version of a dataset: Arrow table, shared frame and its indexes
+
+    Instances are never modified after construction. A reload builds a new
+    Dataset and swaps it in, so a callback holding a Dataset always sees one
+    consistent version of the data.
+    """
+
+    def __init__(self, name, table, version=1, source_stat=None):
+        spec = DATASETS[name]
+        self.name = name
+        self.table = table
+        self.version = version
+        self.source_stat = source_stat
+        self.frame, self.memory = _to_frame(name, table)
+        # Group key tuple -> row positions, so detail views never scan the whole frame
+        keys = spec["group_keys"]
+        grouped = self.frame.groupby(keys, sort=False, observed=True)
+        self.groups = grouped.indices
+        # Group number of every row (-1 for a missing key), to report one search hit per group
+        self.group_ids = grouped.ngroup().to_numpy()
+        # OLC -> row positions
+        olc_column = spec.get("olc_column")
+        self.olc_rows = (self.frame.groupby(olc_column, sort=False, observed=True).indices
+                         if olc_column else {})
+        # Group key tuple -> bounds, centroid and fitted zoom of its shapes
+        self.group_views = _group_views(self.frame, keys) if "shape" in self.frame else {}
+        # Simplified copies of the shapes for zoomed-out maps (LOD zoom -> shapes)
+        self.lod = geo_ingest.simplify_levels(self.frame["shape"].to_numpy()) if "shape" in self.frame else {}
+        # STRtree over the shapes for bbox / point / distance queries
+        self.spatial = spatial_index.SpatialIndex(self.frame["shape"]) if "shape" in self.frame else None
+        # Plus code cells (bounds and center), decoded once per distinct code
+        self.olc_cells = None
+        self.olc_check = None
+        if olc_column:
+            codes = self.frame[olc_column].cat.categories
+            self.olc_cells = pd.DataFrame(plus_codes.decode(codes.to_numpy(dtype=object)), index=codes)
+            if "shape" in self.frame:
+                # Does every geometry centroid fall inside the cell of its recorded OLC?
+                self.olc_check = pd.DataFrame(plus_codes.validate(
+                    self.frame[olc_column].to_numpy(dtype=object), self.frame["shape"].to_numpy()))
+        # Geometry problems found at ingest and OLCs recorded twice in one group
+        self.quality = _quality_report(self)
+        # Main table: one row per group; rowspans are computed per view by rowspan_table
+        self.main = self.frame[keys].drop_duplicates().reset_index(drop=True)
+        # Index behind the main-table search box: plus code prefixes or n-grams
+        search_columns = spec.get("search_columns")
+        self.main_search = None
+        if spec.get("prefix_search_column"):
+            self.main_search = search_index.PrefixIndex(self.main, spec["prefix_search_column"])
+        elif search_columns:
+            self.main_search = search_index.SubstringIndex(self.main, search_columns)
+        self._all_main = np.arange(len(self.main))
+        self._searches = {}
+        # BM25 index over the free-text columns, one document per row
+        text_columns = spec.get("text_columns", [])
+        documents = self.frame[text_columns].fillna("").astype(str).agg(" ".join, axis=1) if text_columns else []
+        self.text_index = text_search.BM25Index(list(documents))
+
+    def group_positions(self, *key):
+        """Return the row positions of one group, e.g. ("Bike use", "B01")"""
+        return self.groups.get(key, np.empty(0, dtype=np.intp))
+
+    def group_view(self, *key):
+        """Return how to frame one group on a map, or None if it has no shapes
+
+        A dict with the bounds (west, south, east, north), the bounds center
+        (center_lon, center_lat), the mean of the row centroids (centroid_lon,
+        centroid_lat) and the zoom that fits the bounds.
+        """
+        return self.group_views.get(key)
+
+    def group(self, *key):
+        """Return the rows of one group in their original order, without scanning the dataset"""
+        return self.frame.take(self.group_positions(*key))
+
+    def search_positions(self, term):
+        """Positions of the main-table rows that match term (case-insensitive substring, or plus code prefix)
+
+        Recent results are kept, so paging through one search never repeats it.
+        """
+        if not term or self.main_search is None:
+            return self._all_main
+        positions = self._searches.get(term)
+        if positions is None:
+            positions = self.main_search.search(term)
+            if len(self._searches) >= SEARCH_CACHE_ENTRIES:
+                self._searches.clear()
+            self._searches[term] = positions
+        return positions
+
+    def search_text(self, query, limit=None):
+        """Groups whose free text matches a query, best first
+
+        Each group is reported once, by its best matching row: a list of dicts
+        with the row position, BM25 score, group key, the matched text and the
+        query string of the group's /detail page.
+        """
+        spec = DATASETS[self.name]
+        positions, scores = self.text_index.search(query)
+        # Results are best first, so the first hit of each group is its best one
+        groups = self.group_ids[positions]
+        _, first = np.unique(groups, return_index=True)
+        keep = np.sort(first[groups[first] >= 0])[:limit]
+        positions, scores = positions[keep], scores[keep]
+        # Only the kept rows are converted to Python objects
+        def values(columns):
+            return list(zip(*(self.frame[column].take(positions).tolist() for column in columns))) or [()] * len(positions)
+        keys = values(spec["group_keys"])
+        texts = values(spec.get("text_columns", []))
+        hits = []
+        for position, score, key, text in zip(positions, scores, keys, texts):
+            hits.append({
+                "dataset": self.name,
+                "row": int(position),
+                "score": float(score),
+                "key": key,
+                "text": " | ".join(value for value in text if isinstance(value, str)),
+                "detail": "&".join(f"{param}={quote(str(value))}" for param, value in zip(spec["detail_params"], key)),
+            })
+        return hits
+
+    def olc_rollup(self, length, prefix=""):
+        """Locations and main-table rows per plus code prefix of a length, under prefix (see PrefixIndex.rollup)"""
+        if not isinstance(self.main_search, search_index.PrefixIndex):
+            return None
+        return self.main_search.rollup(length, prefix)
+
+    def olc(self, olc):
+        """Return the rows recorded for one Open Location Code"""
+        return self.frame.take(self.olc_rows.get(olc, np.empty(0, dtype=np.intp)))
+
+    def shapes_for_zoom(self, zoom):
+        """The shape column at the level of detail that matches a map zoom"""
+        level = geo_ingest.lod_level(zoom)
+        if level is None:
+            return self.frame["shape"].to_numpy()
+        return self.lod[level]
+
+    def olc_cell(self, olc):
+        """Return the decoded cell of one Open Location Code, or None if it is unknown"""
+        if self.olc_cells is None or olc not in self.olc_cells.index:
+            return None
+        return self.olc_cells.loc[olc]
+
+
+_datasets = {}
+_lock = threading.Lock()
+_watcher_pid = None
+_reload_hooks = []
+_marker_seen = None
+
+
+def source_path(name):
+    return os.path.join(DATA_DIR, DATASETS[name]["path"])
+
+
+def _source_stat(name):
+    stat = os.stat(source_path(name))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def detect_encoding(name):
+    """Return the first configured encoding that decodes the whole source file
+
+    The file is decoded incrementally, one CHUNK_BYTES block at a time, so
+    detection never holds more than a block in memory and the CSV is parsed
+    only once afterwards.
+    """
+    spec = DATASETS[name]
+    if len(spec["encodings"]) == 1:
+        return spec["encodings"][0]
+    for encoding in spec["encodings"]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(source_path(name), 'rb') as f:
+                for block in iter(lambda: f.read(CHUNK_BYTES), b''):
+                    decoder.decode(block)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Could not decode {source_path(name)} with any of {spec['encodings']}")
+
+
+def _header(name, encoding):
+    """Column names of a dataset's CSV, read from its first record only"""
+    # Arrow drops a UTF-8 byte order mark, so the names must not keep it either
+    if codecs.lookup(encoding).name == "utf-8":
+        encoding = "utf-8-sig"
+    with open(source_path(name), newline='', encoding=encoding) as f:
+        return next(csv.reader(f), [])
+
+
+def open_reader(name):
+    """Open a streaming CSV reader that yields one record batch per CHUNK_BYTES block
+
+    Every column of the file is read as text. The streaming reader would
+    otherwise infer types from the first block and fail on a later block
+    that does not fit them (a flag that is blank at first, an id that looks
+    numeric); numeric and count columns are coerced per chunk in _normalize
+    instead.
+    """
+    encoding = detect_encoding(name)
+    column_types = {column: pa.string() for column in _header(name, encoding)}
+    return pacsv.open_csv(
+        source_path(name),
+        read_options=pacsv.ReadOptions(encoding=encoding, block_size=CHUNK_BYTES),
+        convert_options=pacsv.ConvertOptions(column_types=column_types)
+    )
+
+
+def _normalize(batch, spec, crs):
+    """Coerce numeric and count columns and add the WGS84 WKB "shape" column to one batch
+
+    Shapes are validated and repaired on the way (see geo_ingest.check_geometries);
+    what was found is kept per row in a "geometry_issue" column.
+    """
+    columns = dict(zip(batch.schema.names, batch.columns))
+    for column in spec["numeric_columns"]:
+        values = pd.to_numeric(columns[column].to_pandas(), errors='coerce')
+        columns[column] = pa.array(values, type=pa.float64(), from_pandas=True)
+    for column in spec.get("count_columns", []):
+        values = pd.to_numeric(columns[column].to_pandas(), errors='coerce')
+        values = values.where(values == values.round())
+        columns[column] = pa.array(values, type=pa.int64(), from_pandas=True)
+    geometry_column = spec.get("geometry_column")
+    if geometry_column:
+        text = columns[geometry_column].to_numpy(zero_copy_only=False)
+        shapes = geo_ingest.parse_wkt(text)
+        shapes, crs = geo_ingest.to_wgs84(shapes, crs)
+        shapes, issues = geo_ingest.check_geometries(shapes, ~pd.isna(text))
+        columns["shape"] = pa.array(shapely.to_wkb(shapes), type=pa.binary())
+        columns["geometry_issue"] = pa.array(issues, type=pa.string())
+    return pa.RecordBatch.from_pydict(columns), crs
+
+
+def ingest(name):
+    """Stream the CSV of a dataset as normalized Arrow record batches
+
+    Every chunk is parsed, coerced and reprojected on its own, so peak memory
+    depends on CHUNK_BYTES rather than on the size of the file. The CRS is
+    declared in the registry or detected on the first chunk, then applied to
+    the whole file.
+    """
+    spec = DATASETS[name]
+    crs = spec.get("crs")
+    reader = open_reader(name)
+    empty = True
+    for batch in reader:
+        empty = False
+        batch, crs = _normalize(batch, spec, crs)
+        yield batch
+    if empty:
+        # Header-only file: still yield one batch so the snapshot has a schema
+        batch, _ = _normalize(pa.RecordBatch.from_pylist([], schema=reader.schema), spec, crs)
+        yield batch
+
+
+def _memory_bytes(frame):
+    return int(frame.memory_usage(index=False, deep=True).sum())
+
+
+def _compact(frame, spec):
+    """Shrink a frame in place: categorical keys, narrow counters and measures
+
+    Repeated key columns become categoricals, so equality filters compare
+    integer codes. Integer columns are downcast to the narrowest type that
+    holds their range; counters with missing values arrive as float64 and
+    become nullable integers first (e.g. UInt16), so they still show as
+    whole numbers. Float measures become float32 only when that leaves
+    every value unchanged at the precision the dashboards display.
+    """
+    for column in spec.get("categorical_columns", []):
+        frame[column] = frame[column].astype("category")
+    for column in spec.get("count_columns", []):
+        if frame[column].dtype.kind == "f":
+            frame[column] = frame[column].astype("Int64")
+    for column in frame.select_dtypes(include="integer").columns:
+        signed = frame[column].min() < 0
+        frame[column] = pd.to_numeric(frame[column], downcast="integer" if signed else "unsigned")
+    for column in spec["numeric_columns"]:
+        values = frame[column]
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow.astype(np.float64).round(FLOAT_DECIMALS),
+                          values.round(FLOAT_DECIMALS), equal_nan=True):
+            frame[column] = narrow
+
+
+def _to_frame(name, table):
+    """Convert an ingested Arrow table into the compact pandas frame shared by the sub-apps
+
+    Returns the frame and its memory use in bytes before and after compaction.
+    """
+    spec = DATASETS[name]
+    has_shape = "shape" in table.column_names
+    frame = table.drop_columns(["shape"]).to_pandas() if has_shape else table.to_pandas()
+    memory = {"before": _memory_bytes(frame)}
+    _compact(frame, spec)
+    memory["after"] = _memory_bytes(frame)
+    # Parsed shapes sit next to the raw WKT so map callbacks never call wkt.loads
+    if has_shape:
+        frame["shape"] = shapely.from_wkb(table.column("shape").to_numpy(zero_copy_only=False))
+        # Geodesic metrics and the check of the shipped ones, computed once for every row
+        for column, values in geo_metrics.measure(frame["shape"].to_numpy()).items():
+            frame[column] = values
+        for column, values in geo_metrics.cross_check(frame, spec).items():
+            frame[column] = values
+    return frame, memory
+
+
+def _group_views(frame, keys):
+    """Per-group bounds, centroid and fitted zoom, computed for all groups at once"""
+    bounds = pd.DataFrame(shapely.bounds(frame["shape"].to_numpy()),
+                          columns=["west", "south", "east", "north"], index=frame.index)
+    bounds["centroid_lon"] = frame["centroid_lon"]
+    bounds["centroid_lat"] = frame["centroid_lat"]
+    views = bounds.groupby([frame[key] for key in keys], sort=False, observed=True).agg(
+        west=("west", "min"), south=("south", "min"), east=("east", "max"), north=("north", "max"),
+        centroid_lon=("centroid_lon", "mean"), centroid_lat=("centroid_lat", "mean"))
+    views = views.dropna(subset=["west"])
+    views["center_lon"] = (views["west"] + views["east"]) / 2
+    views["center_lat"] = (views["south"] + views["north"]) / 2
+    views["zoom"] = geo_ingest.fit_zoom(views["west"], views["south"], views["east"], views["north"])
+    return dict(zip(views.index, views.to_dict('records')))
+
+
+def _quality_report(dataset):
+    """Machine-readable data quality report of a dataset, one entry per problem row"""
+    spec = DATASETS[dataset.name]
+    frame = dataset.frame
+    issues = {}
+    if "geometry_issue" in frame:
+        for position in np.flatnonzero(frame["geometry_issue"].to_numpy(dtype=object) != ""):
+            issues.setdefault(int(position), []).append(str(frame["geometry_issue"].iloc[position]))
+    olc_column = spec.get("olc_column")
+    # Where the OLC is part of the group key, every row of a group shares it by design
+    check_olcs = olc_column and olc_column not in spec["group_keys"]
+    if check_olcs:
+        keys = spec["group_keys"] + [olc_column]
+        duplicated = frame.duplicated(keys, keep=False) & frame[olc_column].notna()
+        for position in np.flatnonzero(duplicated.to_numpy()):
+            issues.setdefault(int(position), []).append("duplicate_olc")
+
+    counts = {}
+    rows = []
+    for position, row_issues in sorted(issues.items()):
+        for issue in row_issues:
+            code = issue.split(':')[0]
+            counts[code] = counts.get(code, 0) + 1
+        entry = {"row": position, "issues": row_issues}
+        for column in keys if check_olcs else spec["group_keys"]:
+            value = frame[column].iloc[position]
+            entry[column] = None if pd.isna(value) else str(value)
+        rows.append(entry)
+    return {
+        "dataset": dataset.name,
+        "version": dataset.version,
+        "rows": len(frame),
+        "issues": counts,
+        "problem_rows": rows,
+    }
+
+
+def write_quality_report(dataset):
+    """Write the quality report of a dataset next to its snapshot, as <name>.quality.json"""
+    path = os.path.join(ingest_cache.CACHE_DIR, f"{dataset.name}.quality.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(ingest_cache.CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dataset.quality, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write quality report for {dataset.name}: {e}")
+
+
+def _build(name, version):
+    """Ingest a dataset (or read its snapshot) and build a new Dataset from it"""
+    # Stat before reading so a change made during the build triggers another reload
+    stat = _source_stat(name)
+    table = ingest_cache.cached_table(name, source_path(name), DATASETS[name], lambda: ingest(name))
+    dataset = Dataset(name, table, version, stat)
+    write_quality_report(dataset)
+    return dataset
+
+
+def get_dataset(name):
+    """Return the current version of a dataset, loading it on first use
+
+    Callbacks that need several lookups should fetch the Dataset once and use
+    its methods, so a reload in between cannot mix two versions.
+    """
+    dataset = _datasets.get(name)
+    if dataset is None:
+        with _lock:
+            if name not in _datasets:
+                _datasets[name] = _build(name, 1)
+            dataset = _datasets[name]
+    return dataset
+
+
+def load_all():
+    """Load every registered dataset; called once before workers fork"""
+    global _marker_seen
+    _marker_seen = _marker_stat()
+    for name in DATASETS:
+        get_dataset(name)
+
+
+def on_reload(hook):
+    """Call hook(dataset) with every dataset reload_dataset() swaps in, e.g. to refresh files derived from it"""
+    _reload_hooks.append(hook)
+
+
+def reload_dataset(name):
+    """Rebuild a dataset and swap it in atomically; returns the new version
+
+    Readers are never blocked: the new Dataset is fully built before it
+    replaces the old one, and requests already holding the old one finish
+    with it. The on_reload hooks run once it is in place.
+    """
+    with _lock:
+        current = _datasets.get(name)
+        dataset = _build(name, current.version + 1 if current else 1)
+        _datasets[name] = dataset
+    for hook in _reload_hooks:
+        try:
+            hook(dataset)
+        except Exception as e:
+            print(f"Error after reloading {name}: {e}")
+    return dataset.version
+
+
+def reload_all():
+    """Reload every registered dataset and return their new versions"""
+    return {name: reload_dataset(name) for name in DATASETS}
+
+
+def versions():
+    """Current version of every loaded dataset"""
+    return {name: dataset.version for name, dataset in _datasets.items()}
+
+
+def _current_stat(name):
+    """_source_stat of a dataset, or None while its source file is missing (e.g. being replaced)"""
+    try:
+        return _source_stat(name)
+    except OSError:
+        return None
+
+
+def _marker_stat():
+    try:
+        return os.stat(RELOAD_MARKER).st_mtime_ns
+    except OSError:
+        return None
+
+
+def request_reload():
+    """Ask every process watching the data to reload all datasets on its next check
+
+    A reload request reaches a single gunicorn worker; touching RELOAD_MARKER
+    lets the watcher of each worker (see start_watcher) pick it up.
+    """
+    with open(RELOAD_MARKER, 'w') as f:
+        f.write(str(time.time_ns()))
+
+
+def changed_datasets():
+    """Names of loaded datasets whose source file changed since they were built"""
+    return [name for name, dataset in list(_datasets.items())
+            if _current_stat(name) != dataset.source_stat]
+
+
+def _watch(interval):
+    global _marker_seen
+    pending = {}
+    while True:
+        time.sleep(interval)
+        # Any error is reported and the next check retried; the watcher thread must never die
+        try:
+            marker = _marker_stat()
+            if marker != _marker_seen:
+                _marker_seen = marker
+                if marker is not None:
+                    print(f"Reload requested, new versions {reload_all()}")
+            for name in changed_datasets():
+                # Wait until the file stops changing so a half-uploaded CSV is never ingested;
+                # a missing file counts as still changing
+                stat = _current_stat(name)
+                if stat is None or pending.get(name) != stat:
+                    pending[name] = stat
+                    continue
+                pending.pop(name)
+                try:
+                    print(f"Reloaded {name} (version {reload_dataset(name)})")
+                except Exception as e:
+                    print(f"Error reloading {name}, keeping the current version: {e}")
+        except Exception as e:
+            print(f"Error checking the source files for changes: {e}")
+
+
+def start_watcher(interval=RELOAD_INTERVAL):
+    """Start the source file watcher of this process; cheap to call on every request
+
+    Threads do not survive gunicorn's fork, so every worker starts its own
+    watcher the first time it calls this.
+    """
+    global _watcher_pid
+    if interval <= 0 or _watcher_pid == os.getpid():
+        return
+    with _lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch, args=(interval,), daemon=True).start()
+
+
+def search_text(query, limit=20):
+    """Best matching groups of a full-text query across every dataset, best first (see Dataset.search_text)"""
+    hits = []
+    for name in DATASETS:
+        hits.extend(get_dataset(name).search_text(query, limit))
+    hits.sort(key=lambda hit: -hit["score"])
+    return hits[:limit]
+
+
+def quality_report(name):
+    """Data quality report of a dataset (see _quality_report)"""
+    return get_dataset(name).quality
+
+
+def memory_report():
+    """Memory use of every loaded frame before and after dtype compaction, in bytes"""
+    return {name: dict(dataset.memory) for name, dataset in _datasets.items()}
+
+
+if __name__ == "__main__":
+    # Print the memory report: python data_store.py
+    load_all()
+    for name, memory in memory_report().items():
+        saved = 100 * (1 - memory["after"] / memory["before"])
+        print(f"{name:<24} {memory['before'] / 1024:>10.1f} KiB -> {memory['after'] / 1024:>10.1f} KiB ({saved:.0f}% smaller)")
+    # And how well the recorded OLCs match the geometries
+    for name, dataset in _datasets.items():
+        if dataset.olc_check is not None:
+            outside = int((~dataset.olc_check["inside"]).sum())
+            worst = dataset.olc_check["distance_m"].max()
+            print(f"{name:<24} {outside} OLCs outside their geometry centroid's cell, max offset {worst:.1f} m")
+    # And the data quality problems found at ingest
+    for name, dataset in _datasets.items():
+        print(f"{name:<24} quality issues: {dataset.quality['issues'] or 'none'}")
+    # And whether the shipped measures match the geometries
+    for name, dataset in _datasets.items():
+        if DATASETS[name].get("shipped_metrics"):
+            print(f"{name:<24} {geo_metrics.report(dataset.frame, DATASETS[name])}")
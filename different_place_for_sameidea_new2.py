@@ -1,14 +1,21 @@
-from dash import Dash, dcc, html, dash_table, ALL, callback_context, Input, Output, State
-import pandas as pd
+from dash import Dash, dcc, html, dash_table, ALL, callback_context, Input, Output, State, Patch, no_update
 from urllib.parse import parse_qs, unquote, quote
-from shapely import wkt
+import data_store
+import figure_cache
+import layout_cache
+import map_view
+import rowspan_table
+import vector_tiles
 import plotly.graph_objects as go
 import plotly.express as px
 import json
+import numpy as np
 
-df = pd.read_csv('./different_place_for_sameidea2.csv')
-df_main = df[['Category', 'Groups']].drop_duplicates().reset_index(drop=True)
-df_main["RowSpan"] = df_main.groupby("Category")["Groups"].transform("count")
+# 数据由共享的 data_store 提供，每次请求时读取，以便数据热更新
+DATASET = "different_place"
+
+# 组范围未知时详情地图的缩放级别
+MAP_ZOOM = 16
 
 # %%
 # 样式定义
@@ -41,81 +48,61 @@ map_style = {
 
 
 # 地图生成函数
-def create_enhanced_map(geometry_data, selected_row_data):
+def create_enhanced_map(geometry_data, selected_row_data, view=None):
+    # 所有多边形合并为一个 trace，线按颜色合并，避免每个几何一个 trace
+    # view 为预先计算的组范围（中心与适配缩放级别），见 Dataset.group_view
     fig = go.Figure()
     colors = px.colors.qualitative.Plotly
-    all_coords = []
 
+    shapes = [data['shape'] for data in geometry_data]
+    line_colors = []
+    fill_colors = []
+    hover_texts = []
     for idx, data in enumerate(geometry_data):
-        geom_str = data['geometry']
-        olc = data['olc']
-
-        try:
-            geom = wkt.loads(geom_str)
-            print(f"Processing {geom.geom_type} with OLC: {olc}")  # 调试输出
-
-            if geom.geom_type in ['Polygon', 'LineString']:
-                # 统一坐标提取方式
-                if geom.geom_type == 'Polygon':
-                    coords = list(geom.exterior.coords)
-                else:  # LineString
-                    coords = list(geom.coords)
-
-                lons = [x for x, y in coords]
-                lats = [y for x, y in coords]
-
-                # 确保坐标有效性
-                if not all(-180 <= lon <= 180 for lon in lons):
-                    print(f"Invalid longitude in {olc}")
-                if not all(-90 <= lat <= 90 for lat in lats):
-                    print(f"Invalid latitude in {olc}")
-
-                color = colors[idx % len(colors)]
-
-                # 创建填充颜色（与线条相同但有透明度）
-                if color.startswith('#'):
-                    r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
-                    fill_color = f"rgba({r}, {g}, {b}, 0.3)"
-                else:
-                    # 尝试从rgb格式转换
-                    fill_color = color.replace('rgb', 'rgba').replace(')', ', 0.3)')
-
-                # 设置填充条件
-                is_selected = selected_row_data and selected_row_data[0]['OLCs'] == olc
-                fill = "toself" if geom.geom_type == 'Polygon' else None
-
-                # 使用lines+markers模式，但将markers的大小设为极小
-                fig.add_trace(go.Scattermapbox(
-                    mode='lines+markers',  # 保留标记但使其非常小
-                    lon=lons,
-                    lat=lats,
-                    line=dict(width=3, color=color),  # 调整线宽
-                    marker=dict(size=2, color=color),  # 使标记点非常小
-                    name=f'{olc}',
-                    hoverinfo='text',
-                    hovertext=f"OLC: {olc}<br>Type: {geom.geom_type}",
-                    fill=fill,
-                    fillcolor=fill_color
-                ))
-
-                all_coords.extend(coords)
-
-        except Exception as e:
-            print(f"Error processing geometry {idx}: {str(e)}")
-            continue
-
-    if all_coords:
-        # 计算坐标范围
-        lons = [x for x, y in all_coords]
-        lats = [y for x, y in all_coords]
-        center_lon = sum(lons) / len(lons)
-        center_lat = sum(lats) / len(lats)
-
-        zoom = 16  # 根据实际情况调整
+        geom = data['shape']
+        color = colors[idx % len(colors)]
+
+        # 创建填充颜色（与线条相同但有透明度）
+        if color.startswith('#'):
+            r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+            fill_color = f"rgba({r}, {g}, {b}, 0.3)"
+        else:
+            # 尝试从rgb格式转换
+            fill_color = color.replace('rgb', 'rgba').replace(')', ', 0.3)')
+
+        line_colors.append(color)
+        fill_colors.append(fill_color)
+        geom_type = geom.geom_type if geom is not None else None
+        hover_texts.append(f"OLC: {data['olc']}<br>Type: {geom_type}")
+
+    # 只画线，不再在每个顶点上重复绘制标记点；悬停信息通过 customdata 保留到每个几何
+    # 每个 OLC 一个图例项，同一 OLC 的几何批量绘制在同一组轨迹中，点击图例可一起显示/隐藏
+    names = [f"{data['olc']}" for data in geometry_data]
+    for trace in map_view.shape_traces(shapes, fill_colors, line_colors, hover_texts, names,
+                                       polygon_line_width=3, point_size=None):
+        fig.add_trace(trace)
+
+    # 选中的 OLC 以图层轮廓高亮
+    selected_olcs = {row['OLCs'] for row in selected_row_data or []}
+    selected_shapes = [data['shape'] for data in geometry_data if data['olc'] in selected_olcs]
+
+    # 底图始终保留；uirevision 使视口回调重绘地图时不重置用户的平移/缩放
+    fig.update_layout(
+        mapbox=dict(style="carto-positron", layers=[map_view.highlight_layer(selected_shapes)]),
+        uirevision=map_view.UIREVISION
+    )
+
+    # 优先使用预先计算的组中心和缩放级别；没有时才根据几何计算中心
+    if view is not None:
+        center = view['center_lon'], view['center_lat']
+    else:
+        center = map_view.center(shapes)
+    if center is not None:
+        center_lon, center_lat = center
+        zoom = view['zoom'] if view is not None else MAP_ZOOM
 
         fig.update_layout(
             mapbox=dict(
-                style="carto-positron",
                 zoom=zoom,
                 center=dict(lat=center_lat, lon=center_lon)
             ),
@@ -135,131 +122,109 @@ def create_enhanced_map(geometry_data, selected_row_data):
 app = Dash(__name__)
 app.config.suppress_callback_exceptions = True
 
+# 提供预先生成的矢量瓦片
+vector_tiles.register_routes(app.server)
+
 # 主页面布局（保持不变）
-main_layout = html.Div([
-    html.H1("Conceptual Classified Responses", style={'textAlign': 'center'}),
-    html.Div(
-        html.Table(
-            style={'width': '100%', 'borderCollapse': 'collapse'},
-            children=[
-                html.Thead(
-                    html.Tr([
-                        html.Th("Category", style=header_style),
-                        html.Th("Groups", style=header_style)
-                    ])
-                ),
-                html.Tbody(id="table-body")
-            ]
-        )
-    )
-])
+# 主表第一页直接渲染进页面，每个数据版本只生成一次
+def build_main_layout(dataset):
+    rows, _, label = rowspan_table.main_page(dataset, main_columns)
+    return html.Div([
+        html.H1("Conceptual Classified Responses", style={'textAlign': 'center'}),
+        html.Div(
+            html.Table(
+                style={'width': '100%', 'borderCollapse': 'collapse'},
+                children=[
+                    html.Thead(
+                        html.Tr([
+                            html.Th("Category", style=header_style),
+                            html.Th("Groups", style=header_style)
+                        ])
+                    ),
+                    html.Tbody(rows, id="table-body")
+                ]
+            )
+        ),
+        # 主表分页，每次只发送一页
+        rowspan_table.pager(label)
+    ])
+
 
+# 生成某个组的地图
+def group_map(dataset, category, group, selected_row_data, relayout_data=None):
+    positions = dataset.group_positions(category, group)
+    view = dataset.group_view(category, group)
+    bounds = map_view.viewport_bounds(relayout_data)
+    zoom = map_view.viewport_zoom(relayout_data) or (view['zoom'] if view else MAP_ZOOM)
+    selection = tuple(row['OLCs'] for row in selected_row_data or [])
+
+    # 大组直接使用预先生成的矢量瓦片，浏览器只加载视口内的瓦片，平移/缩放无需重绘
+    if vector_tiles.use_tiles(dataset, positions):
+        if bounds is not None:
+            return no_update
+        olcs = dataset.frame['OLCs'].take(positions).to_numpy()
+        highlight = map_view.highlight_layer(dataset.shapes_for_zoom(zoom)[positions[np.isin(olcs, selection)]])
+        return map_view.tile_figure(dataset, (category, group), view, px.colors.qualitative.Plotly[0], [highlight])
+
+    def build():
+        # 只发送当前视口内的几何（空间索引查询并裁剪到视口），并按缩放级别选用简化几何
+        filtered_df = dataset.frame.take(positions).assign(
+            shape=map_view.visible_shapes(dataset, positions, bounds, zoom))
+        geometry_data = filtered_df[['shape', 'OLCs']] \
+            .rename(columns={'OLCs': 'olc'}).to_dict('records')
+        return create_enhanced_map(geometry_data, selected_row_data, view)
+
+    # 平移/缩放后的视口几乎不会重复，不缓存；初次打开和选中 OLC 时的地图走图缓存
+    if bounds is not None:
+        return build()
+    return figure_cache.cached_figure((DATASET, dataset.version, (category, group), (selection, zoom)), build)
+
+
+# 主表列：Category 合并单元格，Groups 链接到详情页
+main_columns = [
+    {"column": "Category", "merge": True, "style": cell_style},
+    {"column": "Groups", "style": cell_style,
+     "render": lambda row: dcc.Link(
+         row["Groups"],
+         href=f"/detail?category={quote(row['Category'])}&group={quote(row['Groups'])}",
+         target="_blank",
+         style=link_style
+     )},
+]
+
+# 详情表：Groups、Summary、Keywords 合并单元格，每个 OLC 是一个可点击的按钮
+merged_cell_style = {**cell_style, 'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
+olc_button_style = {
+    'width': '100%',
+    'textAlign': 'center',
+    'backgroundColor': 'transparent',
+    'border': 'none',
+    'cursor': 'pointer',
+    'fontFamily': 'inherit',
+    'fontSize': 'inherit',
+    'padding': '0',
+    'color': 'inherit'
+}
+detail_columns = [
+    {"column": "Groups", "merge": True, "style": merged_cell_style},
+    {"column": "Summary", "merge": True, "style": merged_cell_style},
+    {"column": "Keywords", "merge": True, "style": merged_cell_style},
+    {"column": "OLCs", "style": cell_style,
+     "render": lambda row: html.Button(row["OLCs"], id={'type': 'olc-button', 'index': row["position"]},
+                                       style=olc_button_style)},
+    {"column": "geometry", "style": cell_style},
+]
 
 # 修改详情页面布局，使用HTML表格而不是DataTable来实现真正的单元格合并
 def detail_layout(category, group):
-    filtered_df = df[(df["Category"] == category) & (df["Groups"] == group)]
-
-    # 提取唯一值
-    group_value = filtered_df['Groups'].iloc[0] if not filtered_df.empty else ""
-    summary_value = filtered_df['Summary'].iloc[0] if not filtered_df.empty else ""
-    keywords_value = filtered_df['Keywords'].iloc[0] if not filtered_df.empty else ""
-
-    # 行数
-    num_rows = len(filtered_df)
-
-    # 准备地图数据
-    geometry_data = filtered_df[['geometry', 'OLCs']] \
-        .rename(columns={'OLCs': 'olc'}).to_dict('records')
-
-    # 创建OLC单元格，每个单元格都有一个点击事件
-    olc_cells = []
-    for i in range(num_rows):
-        olc_value = filtered_df['OLCs'].iloc[i] if i < len(filtered_df) else ""
-        # 为每个OLC单元格创建一个可点击的div
-        olc_cell = html.Td(
-            html.Button(
-                olc_value,
-                id={'type': 'olc-button', 'index': i},
-                style={
-                    'width': '100%',
-                    'textAlign': 'center',
-                    'backgroundColor': 'transparent',
-                    'border': 'none',
-                    'cursor': 'pointer',
-                    'fontFamily': 'inherit',
-                    'fontSize': 'inherit',
-                    'padding': '0',
-                    'color': 'inherit'
-                }
-            ),
-            style=cell_style
-        )
-        olc_cells.append(olc_cell)
-
-    # 创建几何单元格
-    geometry_cells = []
-    for i in range(num_rows):
-        geom_value = filtered_df['geometry'].iloc[i] if i < len(filtered_df) else ""
-        geom_cell = html.Td(geom_value, style=cell_style)
-        geometry_cells.append(geom_cell)
-
-    # 创建表格行
-    table_rows = []
-
-    # 第一行包含合并的单元格
-    first_row = html.Tr([
-        # 合并单元格 - Groups
-        html.Td(
-            group_value,
-            rowSpan=num_rows,
-            style={
-                'border': '1px solid #ddd',
-                'padding': '10px',
-                'textAlign': 'center',
-                'verticalAlign': 'middle',
-                'backgroundColor': '#f8f9fa',
-                'fontWeight': 'bold'
-            }
-        ),
-        # 合并单元格 - Summary
-        html.Td(
-            summary_value,
-            rowSpan=num_rows,
-            style={
-                'border': '1px solid #ddd',
-                'padding': '10px',
-                'textAlign': 'center',
-                'verticalAlign': 'middle',
-                'backgroundColor': '#f8f9fa',
-                'fontWeight': 'bold'
-            }
-        ),
-        # 合并单元格 - Keywords
-        html.Td(
-            keywords_value,
-            rowSpan=num_rows,
-            style={
-                'border': '1px solid #ddd',
-                'padding': '10px',
-                'textAlign': 'center',
-                'verticalAlign': 'middle',
-                'backgroundColor': '#f8f9fa',
-                'fontWeight': 'bold'
-            }
-        ),
-        # 第一行的OLCs和Geometry
-        olc_cells[0] if olc_cells else html.Td("", style=cell_style),
-        geometry_cells[0] if geometry_cells else html.Td("", style=cell_style)
-    ])
-    table_rows.append(first_row)
+    dataset = data_store.get_dataset(DATASET)
+    filtered_df = dataset.group(category, group)
 
-    # 添加剩余行
-    for i in range(1, num_rows):
-        row = html.Tr([
-            olc_cells[i] if i < len(olc_cells) else html.Td("", style=cell_style),
-            geometry_cells[i] if i < len(geometry_cells) else html.Td("", style=cell_style)
-        ])
-        table_rows.append(row)
+    # 表格行按数据版本缓存；OLC 按钮的 index 是组内的行号
+    table_rows = rowspan_table.cached_rows(
+        (DATASET, dataset.version, "detail", (category, group)),
+        lambda: rowspan_table.table_rows(filtered_df.assign(position=np.arange(len(filtered_df))), detail_columns)
+    )
 
     return html.Div([
         html.Div(
@@ -304,7 +269,7 @@ def detail_layout(category, group):
         # 地图显示
         dcc.Graph(
             id='geometry-map',
-            figure=create_enhanced_map(geometry_data, []),
+            figure=group_map(dataset, category, group, []),
             style=map_style
         )
     ])
@@ -321,71 +286,45 @@ def display_page(pathname, search):
         params = parse_qs(search.lstrip('?'))
         category = unquote(params.get('category', [None])[0])
         group = unquote(params.get('group', [None])[0])
-        return detail_layout(category, group) if category and group else main_layout
-    return main_layout
+        if category and group:
+            return detail_layout(category, group)
+    return layout_cache.main_layout(DATASET, build_main_layout)
 
 
 @app.callback(
-    Output("table-body", "children"),
-    [Input('url', 'pathname')]
+    [Output("table-body", "children"),
+     Output("table-page", "data"),
+     Output("page-label", "children")],
+    [Input('page-prev', 'n_clicks'),
+     Input('page-next', 'n_clicks')],
+    [State('table-page', 'data')],
+    prevent_initial_call=True
 )
-def update_table_body(_):
-    rows = []
-    current_category = None
-
-    for _, row in df_main.iterrows():
-        category = row["Category"]
-        group = row["Groups"]
-
-        if category != current_category:
-            current_category = category
-            rowspan = int(row["RowSpan"])
-            rows.append(html.Tr([
-                html.Td(
-                    category,
-                    rowSpan=rowspan,
-                    style=cell_style
-                ),
-                html.Td(
-                    dcc.Link(
-                        group,
-                        href=f"/detail?category={quote(category)}&group={quote(group)}",
-                        target="_blank",
-                        style=link_style
-                    ),
-                    style=cell_style
-                )
-            ]))
-        else:
-            rows.append(html.Tr([
-                html.Td(
-                    dcc.Link(
-                        group,
-                        href=f"/detail?category={quote(category)}&group={quote(group)}",
-                        target="_blank",
-                        style=link_style
-                    ),
-                    style=cell_style
-                )
-            ]))
-    return rows
+def update_table_body(prev_clicks, next_clicks, page):
+    # 主表（去重 Category + Groups）由 data_store 预先生成；只生成当前页的行，按数据版本和页码缓存
+    # 第一页随主页面预渲染，此回调只在翻页时运行
+    dataset = data_store.get_dataset(DATASET)
+    page = rowspan_table.turn_page(callback_context.triggered_id, page)
+    return rowspan_table.main_page(dataset, main_columns, page=page)
 
 
-# 处理OLC按钮点击事件
+# 处理OLC按钮点击事件：只用 Patch 更新高亮图层，不重新生成和发送整张地图
 @app.callback(
-    Output('selected-row-data', 'data'),
+    [Output('selected-row-data', 'data'),
+     Output('geometry-map', 'figure', allow_duplicate=True)],
     [Input({'type': 'olc-button', 'index': ALL}, 'n_clicks')],
-    [State('url', 'search')]
+    [State('url', 'search')],
+    prevent_initial_call=True
 )
 def handle_olc_button_click(n_clicks, search):
     ctx = callback_context
     if not ctx.triggered or not any(n_clicks):
-        return []
+        return no_update, no_update
 
     # 获取被点击的按钮ID
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     if not button_id:
-        return []
+        return no_update, no_update
 
     try:
         # 解析按钮索引
@@ -398,40 +337,43 @@ def handle_olc_button_click(n_clicks, search):
         group = unquote(params.get('group', [None])[0])
 
         if category and group:
-            filtered_df = df[(df["Category"] == category) & (df["Groups"] == group)]
-            if button_index < len(filtered_df):
-                selected_row = filtered_df.iloc[button_index]
-                return [{'OLCs': selected_row['OLCs']}]
+            dataset = data_store.get_dataset(DATASET)
+            positions = dataset.group_positions(category, group)
+            if button_index < len(positions):
+                olc = dataset.frame['OLCs'].iloc[positions[button_index]]
+                # 组内记录同一 OLC 的所有几何一起高亮
+                olcs = dataset.frame['OLCs'].take(positions).to_numpy()
+                view = dataset.group_view(category, group)
+                shapes = dataset.shapes_for_zoom(view['zoom'] if view else MAP_ZOOM)[positions[olcs == olc]]
+                patch = Patch()
+                patch['layout']['mapbox']['layers'][0] = map_view.highlight_layer(shapes)
+                return [{'OLCs': olc}], patch
     except Exception as e:
         print(f"Error handling button click: {str(e)}")
 
-    return []
+    return no_update, no_update
 
 
 # 更新地图回调函数
 @app.callback(
     Output('geometry-map', 'figure'),
-    [Input('selected-row-data', 'data'),
-     Input('url', 'search')]
+    [Input('url', 'search'),
+     Input('geometry-map', 'relayoutData')],
+    [State('selected-row-data', 'data')]
 )
-def update_map(selected_row_data, search):
+def update_map(search, relayout_data, selected_row_data):
     params = parse_qs(search.lstrip('?'))
     category = unquote(params.get('category', [None])[0])
     group = unquote(params.get('group', [None])[0])
 
     if category and group:
-        filtered_df = df[(df["Category"] == category) & (df["Groups"] == group)]
-        geometry_data = filtered_df[['geometry', 'OLCs']] \
-            .rename(columns={'OLCs': 'olc'}).to_dict('records')
-        return create_enhanced_map(geometry_data, selected_row_data)
+        dataset = data_store.get_dataset(DATASET)
+        return group_map(dataset, category, group, selected_row_data, relayout_data)
     return go.Figure()  # 返回空图
 
 
-# 应用配置
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    html.Div(id='page-content')
-])
+# 应用配置：页面内容由 display_page 按 URL 填充
+app.layout = layout_cache.app_layout()
 
 if __name__ == "__main__":
     app.run_server(debug=True, port=8050)
\ No newline at end of file
@@ -1,35 +1,35 @@
 # Import necessary libraries
-from dash import Dash, dcc, html, dash_table
+from dash import Dash, dcc, html, dash_table, no_update, callback_context
 from dash.dependencies import Input, Output, State
 import pandas as pd
 from urllib.parse import parse_qs, unquote, quote
 import plotly.graph_objects as go
-from shapely import wkt
 import numpy as np
 import warnings
+import data_store
+import figure_cache
+import layout_cache
+import map_view
+import rowspan_table
+import vector_tiles
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
-# Read the data with correct encoding
-try:
-    df = pd.read_csv("output_location_differences.csv", encoding='cp1252')
-except:
-    # Fallback to UTF-8 if cp1252 fails
-    df = pd.read_csv("output_location_differences.csv", encoding='utf-8')
+# Survey data comes from the shared store and is looked up per request, so a
+# data reload is picked up without restarting the app
+DATASET = "location_differences"
 
-# Ensure numeric columns are properly typed
-df['area'] = pd.to_numeric(df['area'], errors='coerce')
-df['shape_index'] = pd.to_numeric(df['shape_index'], errors='coerce')
-
-# Process main table: deduplicate Category + sub
-df_main = df[['category', 'sub']].drop_duplicates().reset_index(drop=True)
-df_main["RowSpan"] = df_main.groupby("category")["sub"].transform("count")
+# Zoom of the detail map when the group extent is unknown
+MAP_ZOOM = 15
 
 # Initialize Dash app
 app = Dash(__name__)
 app.config.suppress_callback_exceptions = True
 
+# Serve the prebuilt vector tiles for the map
+vector_tiles.register_routes(app.server)
+
 # Style definitions
 header_style = {
     'backgroundColor': 'lightgrey',
@@ -58,21 +58,15 @@ map_style = {
     'borderRadius': '5px'
 }
 
-# Function to convert from Web Mercator to WGS84
-def mercator_to_wgs84(x, y):
-    """Convert Web Mercator (EPSG:3857) coordinates to WGS84 (EPSG:4326)"""
-    # Earth radius in meters
-    R = 6378137
-    # Convert x-coordinate
-    lon = (x * 180) / (R * np.pi)
-    # Convert y-coordinate
-    lat_rad = np.arcsin(np.tanh(y / R))
-    lat = lat_rad * 180 / np.pi
-    return lon, lat
-
 # Function to create map from multiple geometries
-def create_map(filtered_df):
-    """Create a map with multiple geometries in different colors"""
+def create_map(filtered_df, view=None):
+    """Create a map with multiple geometries in different colors
+
+    Shapes are packed into a few traces per legend entry (see
+    map_view.shape_traces), so the figure stays small however many rows
+    there are.
+    view (see Dataset.group_view) frames the map around the whole group.
+    """
     fig = go.Figure()
     
     # If there's no data, return empty figure
@@ -87,217 +81,144 @@ def create_map(filtered_df):
         hue = i / n * 360
         # Increased transparency by changing the alpha value from 0.6 to 0.4
         colors.append(f'rgba({int(255 * (1 + np.sin(hue * np.pi / 180)) / 2)},{int(255 * (1 + np.sin((hue + 120) * np.pi / 180)) / 2)},{int(255 * (1 + np.sin((hue + 240) * np.pi / 180)) / 2)},0.4)')
+    # Increased opacity for outlines, lines and points
+    solid_colors = [color.replace('0.4)', '0.8)') for color in colors]
     
-    # Add each geometry to the map
-    all_lats = []
-    all_lons = []
-    
+    # Format hover text with proper handling of NaN values
+    hover_texts = []
     for i, (idx, row) in enumerate(filtered_df.iterrows()):
-        try:
-            if pd.isna(row['geometry']) or not row['geometry']:
-                continue
-                
-            geom = wkt.loads(row['geometry'])
-            
-            # Format hover text with proper handling of NaN values
-            area_text = f"Area: {row['area']:.2f}" if not pd.isna(row['area']) else "Area: N/A"
-            shape_index_text = f"Shape Index: {row['shape_index']:.2f}" if not pd.isna(row['shape_index']) else "Shape Index: N/A"
-            # wrong_text = f"Wrong: {row['wrong']}" if not pd.isna(row['wrong']) else "Wrong: N/A"
-            response_text = f"Response: {row['response']}" if not pd.isna(row['response']) else "Response: N/A"
-            olc_text = f"OLC: {row['OLCs']}" if not pd.isna(row['OLCs']) else "OLC: N/A"
-            
-            hover_text = f"{response_text}<br>{olc_text}<br>{area_text}<br>{shape_index_text}<br>"
-            
-            if geom.geom_type == 'Polygon':
-                # Get coordinates from polygon exterior
-                coords = list(geom.exterior.coords)
-                lons = []
-                lats = []
-                
-                # Convert each coordinate from Web Mercator to WGS84
-                for x, y in coords:
-                    lon, lat = mercator_to_wgs84(x, y)
-                    lons.append(lon)
-                    lats.append(lat)
-                
-                all_lats.extend(lats)
-                all_lons.extend(lons)
-                
-                # Add the polygon as a filled area
-                fig.add_trace(go.Scattermapbox(
-                    fill="toself",
-                    lon=lons,
-                    lat=lats,
-                    marker={'color': 'black', 'size': 2},  # Reduced marker size
-                    fillcolor=colors[i % len(colors)],
-                    name=f"Row {i+1}",
-                    hoverinfo="text",
-                    text=hover_text
-                ))
-            elif geom.geom_type == 'LineString':
-                # Get coordinates from line
-                coords = list(geom.coords)
-                lons = []
-                lats = []
-                
-                # Convert each coordinate from Web Mercator to WGS84
-                for x, y in coords:
-                    lon, lat = mercator_to_wgs84(x, y)
-                    lons.append(lon)
-                    lats.append(lat)
-                
-                all_lats.extend(lats)
-                all_lons.extend(lons)
-                
-                # Add the line
-                fig.add_trace(go.Scattermapbox(
-                    mode="lines",
-                    lon=lons,
-                    lat=lats,
-                    line={'width': 3, 'color': colors[i % len(colors)].replace('0.4)', '0.8)')},  # Increased line opacity
-                    name=f"Row {i+1}",
-                    hoverinfo="text",
-                    text=hover_text
-                ))
-            elif geom.geom_type == 'Point':
-                # Convert point from Web Mercator to WGS84
-                lon, lat = mercator_to_wgs84(geom.x, geom.y)
-                
-                # Add the point
-                fig.add_trace(go.Scattermapbox(
-                    mode="markers",
-                    lon=[lon],
-                    lat=[lat],
-                    marker={'size': 10, 'color': colors[i % len(colors)].replace('0.4)', '0.8)')},  # Increased marker opacity
-                    name=f"Row {i+1}",
-                    hoverinfo="text",
-                    text=hover_text
-                ))
-                all_lats.append(lat)
-                all_lons.append(lon)
-            elif geom.geom_type == 'MultiPolygon':
-                # Handle MultiPolygon geometries
-                for poly in geom.geoms:
-                    # Get coordinates from polygon exterior
-                    coords = list(poly.exterior.coords)
-                    lons = []
-                    lats = []
-                    
-                    # Convert each coordinate from Web Mercator to WGS84
-                    for x, y in coords:
-                        lon, lat = mercator_to_wgs84(x, y)
-                        lons.append(lon)
-                        lats.append(lat)
-                    
-                    all_lats.extend(lats)
-                    all_lons.extend(lons)
-                    
-                    # Add each polygon as a filled area with the same color
-                    fig.add_trace(go.Scattermapbox(
-                        fill="toself",
-                        lon=lons,
-                        lat=lats,
-                        marker={'color': 'black', 'size': 2},  # Reduced marker size
-                        fillcolor=colors[i % len(colors)],
-                        name=f"Row {i+1}",
-                        hoverinfo="text",
-                        text=hover_text
-                    ))
-        except Exception as e:
-            print(f"Error processing geometry at row {i}: {e}")
-    
-    # Set the map center and zoom
-    if all_lats and all_lons:
-        center_lat = sum(all_lats) / len(all_lats)
-        center_lon = sum(all_lons) / len(all_lons)
-        
-        # Use fixed zoom level that works well
-        zoom = 15
+        area_text = f"Area: {row['area']:.2f}" if not pd.isna(row['area']) else "Area: N/A"
+        geo_area_text = f"Geodesic Area: {row['geo_area']:.2f} m²" if not pd.isna(row['geo_area']) else "Geodesic Area: N/A"
+        shape_index_text = f"Shape Index: {row['shape_index']:.2f}" if not pd.isna(row['shape_index']) else "Shape Index: N/A"
+        # wrong_text = f"Wrong: {row['wrong']}" if not pd.isna(row['wrong']) else "Wrong: N/A"
+        response_text = f"Response: {row['response']}" if not pd.isna(row['response']) else "Response: N/A"
+        olc_text = f"OLC: {row['OLCs']}" if not pd.isna(row['OLCs']) else "OLC: N/A"
         
+        hover_texts.append(f"Row {i+1}<br>{response_text}<br>{olc_text}<br>{area_text}<br>{geo_area_text}<br>{shape_index_text}<br>")
+    
+    # Geometry is parsed and reprojected to WGS84 once at ingest by the data store
+    shapes = filtered_df['shape'].to_numpy()
+    # One legend entry per row, as "Row N"; large groups are told apart by hover text only
+    names = [f"Row {i+1}" for i in range(n)]
+    for trace in map_view.shape_traces(shapes, colors, solid_colors, hover_texts, names):
+        fig.add_trace(trace)
+    
+    # Base map; uirevision keeps the user's pan/zoom when the viewport callback redraws the map
+    fig.update_layout(
+        mapbox_style="carto-positron",
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        uirevision=map_view.UIREVISION
+    )
+    
+    # Set the map center and zoom: precomputed for the group, or from the shapes shown
+    # (only computed when the group has no precomputed view)
+    if view is not None:
+        center = view['center_lon'], view['center_lat']
+    else:
+        center = map_view.center(shapes)
+    if center is not None:
+        center_lon, center_lat = center
+        zoom = view['zoom'] if view is not None else MAP_ZOOM
         fig.update_layout(
-            mapbox_style="carto-positron",
             mapbox=dict(
                 center=dict(lat=center_lat, lon=center_lon),
                 zoom=zoom
-            ),
-            margin={"r": 0, "t": 0, "l": 0, "b": 0}
+            )
         )
     
     return fig
 
-# Main page layout (with search box)
-main_layout = html.Div([
-    html.H1("Location Differences Dashboard", style={'textAlign': 'center'}),
-    html.Div([
-        dcc.Input(id="search-input", type="text", placeholder="Enter Category or Sub"),
-        html.Button("Search", id="search-button")
-    ], style={'textAlign': 'center', 'marginBottom': '20px'}),
-    html.Div(
-        html.Table(
-            id='main-table',
-            style={'width': '100%', 'borderCollapse': 'collapse'},
-            children=[
-                html.Thead(
-                    html.Tr([
-                        html.Th("Category", style=header_style),
-                        html.Th("Sub-Category", style=header_style)
-                    ])
-                ),
-                html.Tbody(id="table-body")
-            ]
-        )
-    )
-])
+def group_map(dataset, category, sub, relayout_data=None):
+    """Map of one group, as seen in the viewport described by relayout_data
 
-# Detail page layout with custom HTML table for cell merging
-def detail_layout(category, sub):
-    filtered_df = df[(df["category"] == category) & (df["sub"] == sub)]
-    
-    # Create data for the HTML table with merged cells
-    table_rows = []
+    Spatial index lookup instead of sending every vertex of the group. The
+    map a detail page opens with is served from the figure cache; panned and
+    zoomed viewports rarely repeat, so those are always built.
+    """
+    positions = dataset.group_positions(category, sub)
+    view = dataset.group_view(category, sub)
+    bounds = map_view.viewport_bounds(relayout_data)
+    zoom = map_view.viewport_zoom(relayout_data) or (view['zoom'] if view else MAP_ZOOM)
     
-    # Get unique sub value and count for merging
-    unique_sub = sub
-    sub_count = len(filtered_df)
+    # Big groups are drawn from the prebuilt vector tiles; the browser fetches
+    # the tiles in view by itself, so pans and zooms need no redraw
+    if vector_tiles.use_tiles(dataset, positions):
+        if bounds is not None:
+            return no_update
+        return map_view.tile_figure(dataset, (category, sub), view, 'rgba(0,102,204,0.8)')
     
-    # Create table rows
-    for i, (_, row) in enumerate(filtered_df.iterrows()):
-        if i == 0:
-            # First row includes the merged sub cell
-            table_rows.append(
-                html.Tr([
-                    # Merged sub cell for first row
-                    html.Td(
-                        unique_sub,
-                        rowSpan=sub_count,
-                        style={
-                            'border': '1px solid #ddd',
-                            'padding': '10px',
-                            'textAlign': 'center',
-                            'verticalAlign': 'middle',
-                            'backgroundColor': '#f5f5f5',
-                            'fontWeight': 'bold'
-                        }
+    def build():
+        filtered_df = dataset.frame.take(positions)
+        return create_map(filtered_df.assign(shape=map_view.visible_shapes(dataset, positions, bounds, zoom)), view)
+
+    if bounds is not None:
+        return build()
+    return figure_cache.cached_figure((DATASET, dataset.version, (category, sub), (None, zoom)), build)
+
+# Main page layout (with search box)
+def build_main_layout(dataset):
+    # The first page of the main table is rendered in; the page is built once per data version
+    rows, _, label = rowspan_table.main_page(dataset, main_columns)
+    return html.Div([
+        html.H1("Location Differences Dashboard", style={'textAlign': 'center'}),
+        html.Div([
+            dcc.Input(id="search-input", type="text", placeholder="Enter Category or Sub"),
+            html.Button("Search", id="search-button")
+        ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+        html.Div(
+            html.Table(
+                id='main-table',
+                style={'width': '100%', 'borderCollapse': 'collapse'},
+                children=[
+                    html.Thead(
+                        html.Tr([
+                            html.Th("Category", style=header_style),
+                            html.Th("Sub-Category", style=header_style)
+                        ])
                     ),
-                    # Other cells for first row
-                    html.Td(row['response'], style=cell_style),
-                    html.Td(f"{row['area']:.2f}" if not pd.isna(row['area']) else "N/A", style=cell_style),
-                    html.Td(f"{row['shape_index']:.2f}" if not pd.isna(row['shape_index']) else "N/A", style=cell_style),
-                    # html.Td(row['wrong'], style=cell_style),
-                    html.Td(row['OLCs'] if not pd.isna(row['OLCs']) else "N/A", style=cell_style)
-                ])
-            )
-        else:
-            # Subsequent rows only need the non-merged cells
-            table_rows.append(
-                html.Tr([
-                    html.Td(row['response'], style=cell_style),
-                    html.Td(f"{row['area']:.2f}" if not pd.isna(row['area']) else "N/A", style=cell_style),
-                    html.Td(f"{row['shape_index']:.2f}" if not pd.isna(row['shape_index']) else "N/A", style=cell_style),
-                    # html.Td(row['wrong'], style=cell_style),
-                    html.Td(row['OLCs'] if not pd.isna(row['OLCs']) else "N/A", style=cell_style)
-                ])
+                    html.Tbody(rows, id="table-body")
+                ]
             )
+        ),
+        # Only one page of the main table is sent at a time
+        rowspan_table.pager(label, search=True)
+    ])
+
+# Main table: category merged over its subs, each sub linking to its detail page
+main_columns = [
+    {"column": "category", "merge": True, "style": cell_style},
+    {"column": "sub", "style": cell_style,
+     "render": lambda row: dcc.Link(
+         row["sub"],
+         href=f"/detail?category={quote(row['category'])}&sub={quote(row['sub'])}",
+         target="_blank",
+         style=link_style
+     )},
+]
+
+def format_measure(value):
+    return f"{value:.2f}" if not pd.isna(value) else "N/A"
+
+# Detail table: the sub merged over all responses of the group
+detail_columns = [
+    {"column": "sub", "merge": True,
+     "style": {**cell_style, 'backgroundColor': '#f5f5f5', 'fontWeight': 'bold'}},
+    {"column": "response", "style": cell_style},
+    {"column": "area", "style": cell_style, "render": lambda row: format_measure(row['area'])},
+    {"column": "shape_index", "style": cell_style, "render": lambda row: format_measure(row['shape_index'])},
+    {"column": "OLCs", "style": cell_style,
+     "render": lambda row: row['OLCs'] if not pd.isna(row['OLCs']) else "N/A"},
+]
+
+# Detail page layout with custom HTML table for cell merging
+def detail_layout(category, sub):
+    dataset = data_store.get_dataset(DATASET)
+    
+    # Table rows with the sub cell merged over the group, built once per data version
+    table_rows = rowspan_table.cached_rows(
+        (DATASET, dataset.version, "detail", (category, sub)),
+        lambda: rowspan_table.table_rows(dataset.group(category, sub), detail_columns)
+    )
     
     return html.Div([
         dcc.Link(
@@ -335,7 +256,7 @@ def detail_layout(category, sub):
         
         dcc.Graph(
             id='geometry-map',
-            figure=create_map(filtered_df),
+            figure=group_map(dataset, category, sub),
             style=map_style
         )
     ])
@@ -351,70 +272,55 @@ def display_page(pathname, search):
         params = parse_qs(search.lstrip('?'))
         category = unquote(params.get('category', [None])[0])
         sub = unquote(params.get('sub', [None])[0])
-        return detail_layout(category, sub) if category and sub else main_layout
-    return main_layout
+        if category and sub:
+            return detail_layout(category, sub)
+    return layout_cache.main_layout(DATASET, build_main_layout)
 
 @app.callback(
-    Output("table-body", "children"),
-    [Input('url', 'pathname'),
-     Input('search-button', 'n_clicks')],
-    [State('search-input', 'value')]
+    [Output("table-body", "children"),
+     Output("table-page", "data"),
+     Output("page-label", "children"),
+     Output("table-search", "data")],
+    [Input('search-button', 'n_clicks'),
+     Input('page-prev', 'n_clicks'),
+     Input('page-next', 'n_clicks')],
+    [State('search-input', 'value'),
+     State('table-page', 'data'),
+     State('table-search', 'data')],
+    prevent_initial_call=True
 )
-def update_table_body(pathname, n_clicks, search_term):
-    # Filter data if search term is provided
-    if search_term:
-        filtered_df = df_main[
-            (df_main["category"].str.contains(search_term, case=False)) | 
-            (df_main["sub"].str.contains(search_term, case=False))
-        ]
-    else:
-        filtered_df = df_main
+def update_table_body(n_clicks, prev_clicks, next_clicks, search_input, page, applied):
+    # Main table (deduplicated category + sub) is prebuilt by the data store;
+    # a search term is looked up in its n-gram index instead of scanning it.
+    # Only the rows of one page are built, once per data version, search term and page.
+    # The first page comes prerendered with the main page, so this only runs on user input.
+    # Pages are taken from the term last applied with Search, not from the box as edited since.
+    dataset = data_store.get_dataset(DATASET)
+    search_term = rowspan_table.applied_search(callback_context.triggered_id, search_input, applied)
+    page = rowspan_table.turn_page(callback_context.triggered_id, page)
+    return (*rowspan_table.main_page(dataset, main_columns, search_term, page), search_term)
 
-    rows = []
-    current_category = None
-
-    for index, row in filtered_df.iterrows():
-        category = row["category"]
-        sub = row["sub"]
-
-        if category != current_category:
-            current_category = category
-            rowspan = int(row["RowSpan"])
-            rows.append(html.Tr([
-                html.Td(
-                    category,
-                    rowSpan=rowspan,
-                    style=cell_style
-                ),
-                html.Td(
-                    dcc.Link(
-                        sub,
-                        href=f"/detail?category={quote(category)}&sub={quote(sub)}",
-                        target="_blank",
-                        style=link_style
-                    ),
-                    style=cell_style
-                )
-            ]))
-        else:
-            rows.append(html.Tr([
-                html.Td(
-                    dcc.Link(
-                        sub,
-                        href=f"/detail?category={quote(category)}&sub={quote(sub)}",
-                        target="_blank",
-                        style=link_style
-                    ),
-                    style=cell_style
-                )
-            ]))
-    return rows
+# Redraw the map with only the geometries inside the current viewport
+@app.callback(
+    Output('geometry-map', 'figure'),
+    [Input('geometry-map', 'relayoutData')],
+    [State('url', 'search')],
+    prevent_initial_call=True
+)
+def update_map_viewport(relayout_data, search):
+    bounds = map_view.viewport_bounds(relayout_data)
+    if bounds is None:
+        return no_update
+    
+    params = parse_qs(search.lstrip('?'))
+    category = unquote(params.get('category', [None])[0])
+    sub = unquote(params.get('sub', [None])[0])
+    
+    dataset = data_store.get_dataset(DATASET)
+    return group_map(dataset, category, sub, relayout_data)
 
-# App configuration
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    html.Div(id='page-content')
-])
+# App configuration: display_page fills the page content from the URL
+app.layout = layout_cache.app_layout()
 
 if __name__ == "__main__":
     app.run_server(debug=True, port=8050)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Figure cache for the detail maps
+--------------------------------
+Building a detail map means slicing shapes, packing traces and validating a
+Plotly figure, and every visit to the same detail page builds the same one.
+Figures are kept in a least-recently-used cache bounded by the size of
+their JSON, keyed by (dataset, version, group key, selection): a data reload
+bumps the version, so stale figures are never served and simply age out.
+
+A figure is stored as its plain dict (go.Figure.to_plotly_json()), which
+Dash sends as a dcc.Graph figure without converting a go.Figure again on
+every hit. Callers must not modify the figures they get back.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+# Total size of the cached figures, as serialized JSON
+FIGURE_CACHE_BYTES = int(os.environ.get('DASHBOARD_FIGURE_CACHE_BYTES', 64 << 20))
+
+
+class FigureCache:
+    """Thread-safe LRU cache of figures with byte-size-aware eviction"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached figure for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, figure):
+        """Cache a figure as its dict, evicting the least recently used ones to stay under max_bytes
+
+        Returns the dict that was cached.
+        """
+        if hasattr(figure, "to_plotly_json"):
+            figure = figure.to_plotly_json()
+        size = len(to_json_plotly(figure))
+        if size > self.max_bytes:
+            return figure
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (figure, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+        return figure
+
+    def get_or_build(self, key, build):
+        """Return the cached figure dict for key, building and caching it with build() on a miss"""
+        figure = self.get(key)
+        if figure is None:
+            figure = self.put(key, build())
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# One cache shared by all sub-apps in a process
+figures = FigureCache(FIGURE_CACHE_BYTES)
+
+
+def cached_figure(key, build):
+    """Return the figure dict for key from the shared cache, building it on a miss"""
+    return figures.get_or_build(key, build)
+
+
+def stats():
+    return figures.stats()
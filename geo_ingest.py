@@ -0,0 +1,221 @@
+"""
+Ingest-time geometry processing
+-------------------------------
+The survey datasets carry their shapes as WKT text, some of them in Web
+Mercator. This module parses the whole column once when a dataset is loaded,
+normalizes it to WGS84 lon/lat in a single NumPy pass and validates and
+repairs it, so the map callbacks only slice ready-made, valid shapely
+geometries and never need per-row error handling.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# Above this many rows the WKT column is parsed and checked in a process pool
+PARALLEL_PARSE_ROWS = 50000
+
+WGS84 = "EPSG:4326"
+WEB_MERCATOR = "EPSG:3857"
+
+# Earth radius in meters used by Web Mercator
+EARTH_RADIUS = 6378137
+
+# Zoom levels that get a simplified copy of every geometry; above the last
+# one maps draw full resolution
+LOD_ZOOMS = [10, 12, 14, 16]
+
+# Simplification tolerance, in screen pixels at the level's zoom
+LOD_PIXELS = 0.5
+TILE_SIZE = 256
+
+# Map size (pixels) that group extents are fitted into, the margin kept
+# around them (fraction of the map) and the closest zoom a fit may pick
+FIT_WIDTH = 800
+FIT_HEIGHT = 500
+FIT_PADDING = 0.1
+FIT_MAX_ZOOM = 18
+
+
+def _pool_context():
+    """Start method of the parse workers: fork only while this is the process's sole thread
+
+    Reloads run in a watcher thread of a threaded gunicorn worker, where a
+    forked child could inherit locks held by other threads and deadlock, so
+    workers are started from a fork server there (spawned where there is none).
+    The single-threaded startup ingest keeps the cheaper fork.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "fork" in methods and threading.active_count() == 1:
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _parallel(func, columns, processes=None):
+    """Apply func to aligned columns, in worker processes when they are large
+
+    Large columns are split into one block per CPU; small ones are handled
+    in-process in a single vectorized call. func returns one array or a
+    tuple of arrays, which are concatenated back in order.
+    """
+    processes = processes or os.cpu_count() or 1
+    if len(columns[0]) < PARALLEL_PARSE_ROWS or processes == 1:
+        return func(*columns)
+
+    chunks = [np.array_split(column, processes) for column in columns]
+    with ProcessPoolExecutor(max_workers=processes, mp_context=_pool_context()) as pool:
+        results = list(pool.map(func, *chunks))
+    if isinstance(results[0], tuple):
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+    return np.concatenate(results)
+
+
+def _parse_chunk(values):
+    """Parse one block of WKT strings; unparsable or missing values become None"""
+    return shapely.from_wkt(values, on_invalid='ignore')
+
+
+def parse_wkt(values, processes=None):
+    """Bulk-parse a column of WKT strings into an object array of geometries"""
+    values = np.asarray(values, dtype=object).copy()
+    values[pd.isna(values)] = None
+    return _parallel(_parse_chunk, [values], processes)
+
+
+def mercator_to_wgs84(coords):
+    """Convert an (N, 2) array of Web Mercator (EPSG:3857) x/y to WGS84 lon/lat"""
+    lon = np.degrees(coords[:, 0] / EARTH_RADIUS)
+    lat = np.degrees(np.arcsin(np.tanh(coords[:, 1] / EARTH_RADIUS)))
+    return np.column_stack([lon, lat])
+
+
+def wgs84_to_mercator(coords):
+    """Convert an (N, 2) array of WGS84 lon/lat to Web Mercator (EPSG:3857) x/y"""
+    x = np.radians(coords[:, 0]) * EARTH_RADIUS
+    y = np.arctanh(np.sin(np.radians(coords[:, 1]))) * EARTH_RADIUS
+    return np.column_stack([x, y])
+
+
+def detect_crs(geometries):
+    """Guess the CRS of a geometry column from its extent
+
+    Anything that fits in the lon/lat value range is taken as WGS84,
+    everything else as Web Mercator meters.
+    """
+    xmin, ymin, xmax, ymax = shapely.total_bounds(geometries)
+    if np.isnan(xmin):
+        return WGS84
+    if -180 <= xmin and xmax <= 180 and -90 <= ymin and ymax <= 90:
+        return WGS84
+    return WEB_MERCATOR
+
+
+def to_wgs84(geometries, crs=None):
+    """Reproject a geometry column to WGS84 in one pass over all of its vertices
+
+    crs declares the source CRS; when it is None it is detected from the data.
+    Returns the reprojected geometries and the source CRS that was used.
+    """
+    crs = crs or detect_crs(geometries)
+    if crs == WGS84:
+        return geometries, crs
+    if crs != WEB_MERCATOR:
+        raise ValueError(f"Unsupported CRS: {crs}")
+    return shapely.transform(geometries, mercator_to_wgs84), crs
+
+
+def _check_chunk(geometries, has_text):
+    """Validate and repair one block of WGS84 geometries; see check_geometries"""
+    geometries = geometries.copy()
+    issues = np.full(len(geometries), "", dtype=object)
+
+    issues[has_text & shapely.is_missing(geometries)] = "parse_error"
+    empty = ~shapely.is_missing(geometries) & shapely.is_empty(geometries)
+    issues[empty] = "empty"
+    geometries[empty] = None
+
+    xmin, ymin, xmax, ymax = shapely.bounds(geometries).T
+    out_of_range = (xmin < -180) | (xmax > 180) | (ymin < -90) | (ymax > 90)
+    issues[out_of_range] = "out_of_range"
+    geometries[out_of_range] = None
+
+    invalid = np.flatnonzero(~shapely.is_missing(geometries) & ~shapely.is_valid(geometries))
+    if len(invalid):
+        # Keep the kind of problem, not the location GEOS appends in brackets
+        reasons = [reason.split('[')[0] for reason in shapely.is_valid_reason(geometries[invalid])]
+        repaired = shapely.make_valid(geometries[invalid], method='structure', keep_collapsed=False)
+        failed = shapely.is_empty(repaired)
+        repaired[failed] = None
+        geometries[invalid] = repaired
+        issues[invalid] = [
+            f"{'invalid' if lost else 'repaired'}: {reason}" for reason, lost in zip(reasons, failed)
+        ]
+    return geometries, issues
+
+
+def check_geometries(geometries, has_text, processes=None):
+    """Validate a parsed WGS84 geometry column and repair what can be repaired
+
+    has_text marks the rows that had WKT in the source. Returns the cleaned
+    geometries (None where nothing usable is left) and one issue string per
+    row, "" for clean rows:
+
+    - parse_error: the WKT text could not be parsed
+    - empty: the geometry has no coordinates
+    - out_of_range: coordinates outside lon/lat range after reprojection
+    - repaired: <reason>: invalid (e.g. a self-intersecting ring), fixed with make_valid
+    - invalid: <reason>: invalid, and make_valid left nothing
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    has_text = np.asarray(has_text, dtype=bool)
+    return _parallel(_check_chunk, [geometries, has_text], processes)
+
+
+def fit_zoom(west, south, east, north, width=FIT_WIDTH, height=FIT_HEIGHT):
+    """Largest Web Mercator zoom at which lon/lat bounds fit in a width x height map
+
+    Vectorized over arrays of bounds. Points and tiny extents get FIT_MAX_ZOOM;
+    zooms are rounded down to a tenth so the extent always stays in view.
+    """
+    west, south, east, north = (np.asarray(v, dtype=np.float64) for v in (west, south, east, north))
+    # Extent as a fraction of the Mercator world, which is TILE_SIZE pixels wide at zoom 0
+    dx = (east - west) / 360
+    top, bottom = (np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) for lat in (north, south))
+    dy = (top - bottom) / (2 * np.pi)
+    usable = 1 - 2 * FIT_PADDING
+    with np.errstate(divide='ignore'):
+        zoom = np.fmin(np.log2(width * usable / (TILE_SIZE * dx)),
+                       np.log2(height * usable / (TILE_SIZE * dy)))
+    return np.clip(np.floor(zoom * 10) / 10, 0, FIT_MAX_ZOOM)
+
+
+def lod_tolerance(zoom):
+    """Degrees covered by LOD_PIXELS screen pixels of longitude at a zoom level"""
+    return 360 / (TILE_SIZE * 2 ** zoom) * LOD_PIXELS
+
+
+def simplify_levels(geometries):
+    """Topology-preserving Douglas-Peucker copies of a geometry column, one per LOD zoom
+
+    Each level drops only detail smaller than half a pixel at its zoom, so
+    the maps look the same while sending far fewer vertices when zoomed out.
+    """
+    return {
+        zoom: shapely.simplify(geometries, lod_tolerance(zoom), preserve_topology=True)
+        for zoom in LOD_ZOOMS
+    }
+
+
+def lod_level(zoom):
+    """The LOD zoom to draw at a map zoom, or None for full resolution"""
+    if zoom is None:
+        return None
+    for level in LOD_ZOOMS:
+        if zoom <= level:
+            return level
+    return None
@@ -0,0 +1,42 @@
+"""
+Cached main pages of the sub-apps
+---------------------------------
+A sub-app's main page (title, search box and the first page of its main
+table) depends only on its dataset, yet it used to be rebuilt on every
+visit. main_layout() builds it once per dataset version, so opening a
+dashboard costs a dictionary lookup; a data reload bumps the version and the
+page is rebuilt on the next visit.
+
+Every sub-app uses app_layout() as its Dash layout: an empty page content
+that display_page fills from dcc.Location, with the cached main page for
+"/" and the detail page otherwise, so a detail page opened in a new tab
+never shows the main table first.
+"""
+
+import threading
+
+from dash import dcc, html
+
+import data_store
+
+_pages = {}
+_lock = threading.Lock()
+
+
+def app_layout():
+    """The layout every sub-app uses: URL location and the page content it routes to"""
+    return html.Div([
+        dcc.Location(id='url', refresh=False),
+        html.Div(id='page-content')
+    ])
+
+
+def main_layout(name, build):
+    """Main page of dataset name at its current version, built once per version with build(dataset)"""
+    dataset = data_store.get_dataset(name)
+    entry = _pages.get(name)
+    if entry is None or entry[0] != dataset.version:
+        entry = (dataset.version, build(dataset))
+        with _lock:
+            _pages[name] = entry
+    return entry[1]
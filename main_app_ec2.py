@@ -10,9 +10,14 @@ import random
 import time
 import webbrowser
 import socket
+from flask import request, jsonify
+import data_store
+import figure_cache
+import vector_tiles
 
 # Global variables
 browser_opened = False
+SEARCH_RESULTS = 20  # Results shown by the global search
 EC2_MODE = os.environ.get('EC2_MODE', '0') == '1'  # Environment variable to determine if running on EC2
 
 # Use a light modern theme with BOOTSTRAP + Font Awesome for icons
@@ -27,6 +32,44 @@ app = Dash(
 )
 server = app.server
 
+# Load every survey dataset once, before gunicorn forks its workers (--preload)
+data_store.load_all()
+
+# Prebuilt vector tiles of the survey geometries (python vector_tiles.py), cut again after every reload
+vector_tiles.register_routes(server)
+data_store.on_reload(vector_tiles.refresh_tiles)
+
+# Each worker watches the survey CSVs and hot-reloads them when they change
+@server.before_request
+def start_data_watcher():
+    data_store.start_watcher()
+
+# Admin endpoints are disabled unless DASHBOARD_ADMIN_TOKEN is set; send it in X-Admin-Token
+def admin_allowed():
+    token = os.environ.get('DASHBOARD_ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+# Reload the survey data in every worker, without a restart
+@server.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    if not admin_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    if data_store.RELOAD_INTERVAL > 0:
+        # Each worker's watcher sees the reload marker on its next check and rebuilds in the background
+        data_store.request_reload()
+    else:
+        # No watchers: rebuild in this worker only; the new versions are swapped in when ready
+        threading.Thread(target=data_store.reload_all, daemon=True).start()
+    return jsonify({"status": "reloading", "versions": data_store.versions()}), 202
+
+# Data versions, quality issue counts and figure cache hit/miss counters of this worker
+@server.route("/admin/stats")
+def admin_stats():
+    if not admin_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    quality = {name: data_store.quality_report(name)["issues"] for name in data_store.DATASETS}
+    return jsonify({"versions": data_store.versions(), "quality": quality, "figure_cache": figure_cache.stats()})
+
 # Define dashboard items with icons
 dashboard_items = [
     {
@@ -79,6 +122,16 @@ dashboard_items = [
     }
 ]
 
+# Dashboard serving a path: its own path, or a page below it such as /geometry/detail
+def find_dashboard(pathname):
+    for item in dashboard_items:
+        if pathname == item["path"] or (pathname or "").startswith(item["path"] + "/"):
+            return item
+    return None
+
+# Dashboard title and path per dataset, for the search results
+dashboards_by_dataset = {item["module_name"]: item for item in dashboard_items}
+
 # The rest of the code remains largely unchanged...
 # [Keep the existing functions like create_dashboard_cards, create_header, etc.]
 
@@ -245,6 +298,57 @@ def create_header():
         }
     )
 
+# Global full-text search over every dashboard's responses
+def create_search_box():
+    return html.Div(
+        [
+            dbc.InputGroup(
+                [
+                    dbc.Input(
+                        id="global-search",
+                        type="search",
+                        placeholder="Search all responses, e.g. \"pump track\" or \"restrooms\"",
+                        debounce=True,
+                        size="lg"
+                    ),
+                    dbc.Button(
+                        html.I(className="fas fa-search"),
+                        id="global-search-button",
+                        color="primary"
+                    )
+                ],
+                className="mb-3"
+            ),
+            html.Div(id="global-search-results")
+        ],
+        className="mx-auto mb-5",
+        style={"maxWidth": "800px"}
+    )
+
+# One result row: dashboard badge, matched text and a link to the group's detail page
+def create_search_result(hit):
+    item = dashboards_by_dataset[hit["dataset"]]
+    return dcc.Link(
+        html.Div(
+            [
+                html.Span(
+                    item["title"],
+                    className="badge me-3",
+                    style={"backgroundColor": item["color"], "minWidth": "160px"}
+                ),
+                html.Div(
+                    [
+                        html.Div(hit["text"], className="fw-semibold"),
+                        html.Small(" / ".join(str(part) for part in hit["key"]), className="text-muted")
+                    ]
+                )
+            ],
+            className="d-flex align-items-center p-2 border-bottom"
+        ),
+        href=f"{item['path']}/detail?{hit['detail']}",
+        style={"textDecoration": "none", "color": "#333"}
+    )
+
 # Homepage layout with clean, modern design
 home_layout = html.Div(
     [
@@ -254,6 +358,9 @@ home_layout = html.Div(
         # Main content container
         dbc.Container(
             [
+                # Search across all dashboards
+                create_search_box(),
+
                 # Section title
                 html.Div(
                     [
@@ -462,11 +569,7 @@ def show_status(pathname, running_subapps_data):
         return False, "", "", "primary"
     
     # Find matching dashboard
-    selected_dashboard = None
-    for item in dashboard_items:
-        if item["path"] == pathname:
-            selected_dashboard = item
-            break
+    selected_dashboard = find_dashboard(pathname)
     
     if not selected_dashboard:
         return False, "", "", "primary"
@@ -488,11 +591,7 @@ def show_loading(pathname, running_subapps_data):
         return ""
     
     # Find matching dashboard
-    selected_dashboard = None
-    for item in dashboard_items:
-        if item["path"] == pathname:
-            selected_dashboard = item
-            break
+    selected_dashboard = find_dashboard(pathname)
     
     if not selected_dashboard:
         return ""
@@ -503,6 +602,21 @@ def show_loading(pathname, running_subapps_data):
     else:
         return loading_layout
 
+# Global search: ranked matches with deep links to the detail pages
+@app.callback(
+    Output("global-search-results", "children"),
+    [Input("global-search-button", "n_clicks"),
+     Input("global-search", "value")],
+    prevent_initial_call=True
+)
+def update_search_results(n_clicks, query):
+    if not query or not query.strip():
+        return None
+    hits = data_store.search_text(query, limit=SEARCH_RESULTS)
+    if not hits:
+        return html.P("No matching responses", className="text-muted text-center")
+    return html.Div([create_search_result(hit) for hit in hits], className="bg-white rounded shadow-sm")
+
 # Global variable to store sub-app processes
 running_subapps = {}
 
@@ -612,10 +726,11 @@ def run_subapp(module, port, module_name):
      Output("debug-info", "children"),
      Output("debug-info", "style"),
      Output("running-subapps", "data")],
-    [Input("url", "pathname")],
+    [Input("url", "pathname"),
+     Input("url", "search")],
     [State("running-subapps", "data")]
 )
-def display_page(pathname, running_subapps_data):
+def display_page(pathname, search, running_subapps_data):
     global running_subapps
     print(f"URL path changed to: {pathname}")
     
@@ -627,11 +742,7 @@ def display_page(pathname, running_subapps_data):
     button_style = {"display": "block", "borderRadius": "30px", "boxShadow": "0 4px 10px rgba(0,0,0,0.1)"}
     
     # Find matching dashboard
-    selected_dashboard = None
-    for item in dashboard_items:
-        if item["path"] == pathname:
-            selected_dashboard = item
-            break
+    selected_dashboard = find_dashboard(pathname)
             
     if not selected_dashboard:
         return home_layout, {"display": "none"}, "Unknown path", {"display": "block", "padding": "10px", "background": "#f8d7da"}, running_subapps_data
@@ -793,7 +904,8 @@ def display_page(pathname, running_subapps_data):
             ),
             html.Iframe(
                 id="dashboard-iframe",
-                src=f"http://127.0.0.1:{port}/",
+                # Deep links such as /geometry/detail?... open that page of the sub-app
+                src=f"http://127.0.0.1:{port}{pathname[len(selected_dashboard['path']):] or '/'}{search or ''}",
                 style={
                     "width": "100%", 
                     "height": "800px", 
@@ -884,12 +996,12 @@ def reload_iframe(n_clicks, pathname, running_subapps_data):
         return dash.no_update
     
     # Find matching dashboard and port
-    for item in dashboard_items:
-        if item["path"] == pathname and pathname in running_subapps_data:
-            port = running_subapps_data[pathname]["port"]
-            # Add timestamp to avoid caching
-            timestamp = int(time.time())
-            return f"http://127.0.0.1:{port}/?t={timestamp}"
+    item = find_dashboard(pathname)
+    if item and item["path"] in running_subapps_data:
+        port = running_subapps_data[item["path"]]["port"]
+        # Add timestamp to avoid caching
+        timestamp = int(time.time())
+        return f"http://127.0.0.1:{port}/?t={timestamp}"
     
     # If no matching dashboard is found, return current src
     return dash.no_update
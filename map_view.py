@@ -0,0 +1,278 @@
+"""
+Viewport helpers for the geometry maps
+--------------------------------------
+Turns the relayoutData a dcc.Graph reports after a pan or zoom into a
+lon/lat viewport and zoom, and uses the dataset spatial index to keep only
+the shapes that are on screen, clipped to the viewport and simplified to
+the level of detail of the zoom. Also packs the shapes into a handful of
+Plotly traces per legend entry, instead of one trace per geometry.
+"""
+
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+import shapely
+from flask import has_request_context, request
+
+import vector_tiles
+
+# Extra margin around the viewport, as a fraction of its size, so small pans
+# do not reveal clipped edges before the next update arrives
+VIEWPORT_PADDING = 0.1
+
+# Keeps the user's pan/zoom when a callback replaces the map figure
+UIREVISION = "geometry-map"
+
+# Outline drawn around selected shapes
+HIGHLIGHT_COLOR = "#000000"
+HIGHLIGHT_WIDTH = 6
+
+# Most legend entries a map gets; beyond that its shapes are packed into
+# unnamed traces and told apart by their hover text only
+LEGEND_MAX_ENTRIES = 50
+
+
+def viewport_bounds(relayout_data):
+    """Return (west, south, east, north) of the visible map, or None if unknown"""
+    if not relayout_data:
+        return None
+    derived = relayout_data.get('mapbox._derived') or {}
+    corners = derived.get('coordinates')
+    if not corners:
+        return None
+    lons = [lon for lon, lat in corners]
+    lats = [lat for lon, lat in corners]
+    west, east, south, north = min(lons), max(lons), min(lats), max(lats)
+    pad_x = (east - west) * VIEWPORT_PADDING
+    pad_y = (north - south) * VIEWPORT_PADDING
+    return west - pad_x, south - pad_y, east + pad_x, north + pad_y
+
+
+def viewport_zoom(relayout_data):
+    """Return the current map zoom, or None if the figure did not report one"""
+    if not relayout_data:
+        return None
+    return relayout_data.get('mapbox.zoom')
+
+
+def visible_shapes(dataset, positions, bounds, zoom=None):
+    """Shapes of the given rows as drawn in a viewport at a zoom level
+
+    The result is aligned with positions: shapes outside the viewport are
+    None and the others are clipped to it, so map builders keep their
+    per-row colors and only draw what is on screen. Shapes come from the
+    precomputed level of detail that matches the zoom.
+    """
+    shapes = dataset.shapes_for_zoom(zoom)[positions]
+    if bounds is None or dataset.spatial is None:
+        return shapes
+    visible = np.isin(positions, dataset.spatial.bbox(*bounds))
+    clipped = np.full(len(positions), None, dtype=object)
+    clipped[visible] = shapely.clip_by_rect(shapes[visible], *bounds)
+    clipped[visible & shapely.is_empty(clipped)] = None
+    return clipped
+
+
+def _parts(shapes, types):
+    """Single-part geometries of the given shapely type ids, with the position of the row each came from"""
+    shapes = np.asarray(shapes, dtype=object)
+    keep = np.flatnonzero(np.isin(shapely.get_type_id(shapes), types))
+    parts, index = shapely.get_parts(shapes[keep], return_index=True)
+    return parts, keep[index]
+
+
+def _with_gaps(parts):
+    """Vertices of many lines as one (N, 2) array, with a NaN row after each line
+
+    Plotly draws the rows between two gaps as a separate line, so a single
+    trace can carry any number of lines.
+    """
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+    out = np.full((len(coords) + len(parts), 2), np.nan)
+    out[np.arange(len(coords)) + index] = coords
+    part_of_row = np.full(len(out), -1)
+    part_of_row[np.arange(len(coords)) + index] = index
+    return out, part_of_row
+
+
+def _geojson(shapes):
+    """GeoJSON geometry dicts of the shapes, serialized in one vectorized call"""
+    return json.loads('[' + ','.join(shapely.to_geojson(np.asarray(shapes, dtype=object))) + ']')
+
+
+def polygon_trace(shapes, fill_colors, line_colors, hovertext, line_width=1, name=None):
+    """One Choroplethmapbox trace drawing every polygon in shapes, or None if there are none
+
+    The polygons are sent as an inline GeoJSON FeatureCollection whose
+    feature ids are row positions; colors, hover text and customdata are
+    per row, so each feature keeps its own look and hover.
+    """
+    parts, rows = _parts(shapes, [3, 6])
+    if len(parts) == 0:
+        return None
+    rows = np.unique(rows)
+    geometries = _geojson(np.asarray(shapes, dtype=object)[rows])
+    features = [
+        {"type": "Feature", "id": int(row), "geometry": geometry}
+        for row, geometry in zip(rows, geometries)
+    ]
+    # Each row gets its own z value and the colorscale maps it back to the row color
+    scale = [fill_colors[row] for row in rows]
+    if len(scale) == 1:
+        scale = scale * 2
+    colorscale = [[k / (len(scale) - 1), color] for k, color in enumerate(scale)]
+    return go.Choroplethmapbox(
+        geojson={"type": "FeatureCollection", "features": features},
+        locations=rows,
+        z=np.arange(len(rows)),
+        zmin=0,
+        zmax=max(len(rows) - 1, 1),
+        colorscale=colorscale,
+        showscale=False,
+        marker={'line': {'color': [line_colors[row] for row in rows], 'width': line_width}},
+        customdata=rows,
+        hovertext=[hovertext[row] for row in rows],
+        hoverinfo='text',
+        name=name,
+        showlegend=name is not None
+    )
+
+
+def line_traces(shapes, colors, hovertext, width=3, name=None):
+    """Scattermapbox traces drawing every line in shapes, one trace per color
+
+    Lines of one color are packed into one trace separated by gaps; each
+    vertex carries its row position as customdata and the row hover text.
+    """
+    parts, rows = _parts(shapes, [1, 5])
+    traces = []
+    if len(parts) == 0:
+        return traces
+    part_colors = np.array([colors[row] for row in rows], dtype=object)
+    for color in dict.fromkeys(part_colors):
+        same = part_colors == color
+        coords, part = _with_gaps(parts[same])
+        vertex_rows = np.where(part >= 0, rows[same][part], -1)
+        traces.append(go.Scattermapbox(
+            mode='lines',
+            lon=coords[:, 0],
+            lat=coords[:, 1],
+            line={'width': width, 'color': color},
+            customdata=vertex_rows,
+            hovertext=[hovertext[row] if row >= 0 else None for row in vertex_rows],
+            hoverinfo='text',
+            name=name,
+            showlegend=name is not None
+        ))
+    return traces
+
+
+def point_trace(shapes, colors, hovertext, size=10, name=None):
+    """One Scattermapbox trace with a marker for every point in shapes, or None if there are none"""
+    parts, rows = _parts(shapes, [0, 4])
+    if len(parts) == 0:
+        return None
+    return go.Scattermapbox(
+        mode='markers',
+        lon=shapely.get_x(parts),
+        lat=shapely.get_y(parts),
+        marker={'size': size, 'color': [colors[row] for row in rows]},
+        customdata=rows,
+        hovertext=[hovertext[row] for row in rows],
+        hoverinfo='text',
+        name=name,
+        showlegend=name is not None
+    )
+
+
+def shape_traces(shapes, fill_colors, line_colors, hovertext, names=None,
+                 polygon_line_width=1, line_width=3, point_size=10):
+    """Polygon, line and point traces drawing every shape, batched per legend entry
+
+    names gives the legend entry of each row. The rows of one entry share
+    their traces, tied by a legendgroup, so clicking the entry shows or hides
+    all of them. Without names, or with more than LEGEND_MAX_ENTRIES
+    entries, all rows are packed into a few unnamed traces. With point_size
+    None, points are not drawn.
+    """
+    shapes = np.asarray(shapes, dtype=object)
+    if names is None or len(dict.fromkeys(names)) > LEGEND_MAX_ENTRIES:
+        groups = [(None, shapes)]
+    else:
+        names = np.asarray(names, dtype=object)
+        # Rows of other entries are None, so customdata stays the row position
+        groups = [(name, np.where(names == name, shapes, None)) for name in dict.fromkeys(names)]
+    traces = []
+    for name, group_shapes in groups:
+        group = [
+            polygon_trace(group_shapes, fill_colors, line_colors, hovertext, polygon_line_width, name),
+            *line_traces(group_shapes, line_colors, hovertext, line_width, name),
+            point_trace(group_shapes, line_colors, hovertext, point_size, name) if point_size is not None else None
+        ]
+        group = [trace for trace in group if trace is not None]
+        for k, trace in enumerate(group):
+            trace.legendgroup = name
+            trace.showlegend = name is not None and k == 0
+        traces.extend(group)
+    return traces
+
+
+def highlight_layer(shapes):
+    """Mapbox layout layer outlining the shapes; maps keep it at layout.mapbox.layers[0]
+
+    Selection lives in the layout rather than in the traces, so changing it
+    is a small Patch that leaves the trace data untouched. With no shapes
+    the layer is kept, hidden, so its index never moves.
+    """
+    shapes = [shape for shape in shapes if shape is not None]
+    features = [{"type": "Feature", "properties": {}, "geometry": geometry} for geometry in _geojson(shapes)] if shapes else []
+    return {
+        'sourcetype': 'geojson',
+        'source': {"type": "FeatureCollection", "features": features},
+        'type': 'line',
+        'color': HIGHLIGHT_COLOR,
+        'line': {'width': HIGHLIGHT_WIDTH},
+        'visible': bool(features)
+    }
+
+
+def tile_layers(name, key, color):
+    """Mapbox layout layers drawing one group from the dataset's vector tiles"""
+    # Mapbox needs absolute URLs; the TileJSON gives it the zoom range of the
+    # tiles, so it overzooms the deepest ones rather than asking for more
+    root = request.host_url if has_request_context() else "/"
+    source = vector_tiles.tilejson_url(name, root)
+    layer = vector_tiles.group_layer(key)
+    common = {'sourcetype': 'vector', 'source': source, 'sourcelayer': layer, 'minzoom': vector_tiles.TILE_MIN_ZOOM}
+    return [
+        dict(common, type='fill', color=color, opacity=0.4),
+        dict(common, type='line', color=color, line={'width': 2}),
+    ]
+
+
+def tile_figure(dataset, key, view, color, layers=()):
+    """Map of one group drawn from vector tiles instead of trace coordinates
+
+    view is the group view from the dataset (see Dataset.group_view); layers
+    are put in front of the tile layers, e.g. a highlight layer.
+    """
+    # A mapbox subplot is only drawn when some trace uses it
+    fig = go.Figure(go.Scattermapbox(lon=[], lat=[], showlegend=False))
+    fig.update_layout(
+        mapbox=dict(style="carto-positron", layers=[*layers, *tile_layers(dataset.name, key, color)]),
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        uirevision=UIREVISION
+    )
+    if view is not None:
+        fig.update_layout(mapbox=dict(center=dict(lon=view["center_lon"], lat=view["center_lat"]), zoom=view["zoom"]))
+    return fig
+
+
+def center(shapes):
+    """Mean (lon, lat) of all vertices of the shapes, or None if there are none"""
+    coords = shapely.get_coordinates(np.asarray(shapes, dtype=object))
+    if len(coords) == 0:
+        return None
+    lon, lat = coords.mean(axis=0)
+    return lon, lat
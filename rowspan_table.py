@@ -0,0 +1,202 @@
+"""
+Merged-cell HTML tables for the sub-apps
+----------------------------------------
+Every sub-app shows its data as an html.Table in which the leading columns
+are merged over runs of equal values with rowSpan. table_rows() builds the
+html.Tr list for a frame from a list of column specs:
+
+    {"column": "category", "merge": True, "style": cell_style}
+    {"column": "sub", "style": cell_style, "render": lambda row: dcc.Link(...)}
+
+The rowspans of all merged columns come from one vectorized pass over the
+frame (see rowspans), so filtered tables stay correct, and a merged column
+also breaks wherever a merged column before it breaks. Built rows are kept
+in a small LRU cache; callers key them by dataset version and filter.
+
+Main tables are paged: only PAGE_SIZE rows are built and sent per callback.
+Rowspans are computed on the page itself, so a run cut by a page boundary
+starts again, merged, at the top of the next page. main_page() builds one
+page of a dataset's main table, pager() is the shared Previous / Next
+control and turn_page() its callback logic. Searchable tables page against
+the term last applied with the Search button (see applied_search), kept in
+the pager's "table-search" store.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from dash import dcc, html
+
+# Number of built tables kept per process
+TABLE_CACHE_ENTRIES = 256
+
+# Main-table rows per page
+PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+
+pager_button_style = {
+    'padding': '5px 15px',
+    'border': '1px solid #ddd',
+    'borderRadius': '4px',
+    'backgroundColor': 'white',
+    'cursor': 'pointer'
+}
+
+
+def rowspans(frame, columns):
+    """rowSpan of every row for each merged column, as {column: array}
+
+    A run of consecutive equal values gets its length at its first row and
+    0 at the rows it covers. Runs of a column are nested in the runs of the
+    columns before it.
+    """
+    spans = {}
+    starts = np.zeros(len(frame), dtype=bool)
+    if len(frame):
+        starts[0] = True
+    for column in columns:
+        # Factorized codes compare missing values as equal
+        codes = pd.factorize(frame[column], use_na_sentinel=True)[0]
+        starts[1:] |= codes[1:] != codes[:-1]
+        run = np.cumsum(starts) - 1
+        lengths = np.bincount(run, minlength=run[-1] + 1 if len(run) else 0)
+        spans[column] = np.where(starts, lengths[run], 0)
+    return spans
+
+
+def _cell(column, row, span=None):
+    render = column.get("render")
+    children = render(row) if render else row[column["column"]]
+    if span is None:
+        return html.Td(children, style=column.get("style"))
+    return html.Td(children, rowSpan=int(span), style=column.get("style"))
+
+
+def table_rows(frame, columns, empty_message=None):
+    """html.Tr rows of a frame, merging the columns marked "merge"
+
+    render(row), if given, builds the cell content from the row as a dict;
+    otherwise the column value is shown. With no rows, a single row showing
+    empty_message is returned (or no rows at all without one).
+    """
+    if frame.empty:
+        if empty_message is None:
+            return []
+        return [html.Tr(html.Td(empty_message, colSpan=len(columns),
+                                style={'textAlign': 'center', 'padding': '20px'}))]
+    spans = rowspans(frame, [column["column"] for column in columns if column.get("merge")])
+    rows = []
+    for i, row in enumerate(frame.to_dict('records')):
+        cells = []
+        for column in columns:
+            if not column.get("merge"):
+                cells.append(_cell(column, row))
+            elif spans[column["column"]][i]:
+                cells.append(_cell(column, row, spans[column["column"]][i]))
+        rows.append(html.Tr(cells))
+    return rows
+
+
+def page_count(total):
+    return max(1, -(-total // PAGE_SIZE))
+
+
+def page_slice(positions, page):
+    """The positions shown on one page"""
+    return positions[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+
+
+def turn_page(trigger, page):
+    """Page to show after a callback fired by the input with id trigger
+
+    The pager buttons move one page; anything else (a new search) goes back
+    to the first page. main_page() keeps the result within the table.
+    """
+    page = page or 0
+    if trigger == "page-prev":
+        return page - 1
+    if trigger == "page-next":
+        return page + 1
+    return 0
+
+
+def applied_search(trigger, search_input, applied):
+    """Search term to page against after a callback fired by the input with id trigger
+
+    The Search button applies the box's value; paging keeps the term last
+    applied, so editing the box without searching never changes the result
+    set being paged.
+    """
+    if trigger == "search-button":
+        return search_input
+    return applied
+
+
+def page_label(page, total):
+    return f"Page {page + 1} of {page_count(total)} ({total} rows)"
+
+
+def main_page(dataset, columns, search_term=None, page=0, empty_message=None):
+    """(rows, page, label) of one page of a dataset's main table
+
+    Rows come from Dataset.search_positions and are built once per data
+    version, search term and page.
+    """
+    positions = dataset.search_positions(search_term)
+    page = min(max(page, 0), page_count(len(positions)) - 1)
+    rows = cached_rows(
+        (dataset.name, dataset.version, "main", search_term or "", page),
+        lambda: table_rows(dataset.main.take(page_slice(positions, page)), columns, empty_message)
+    )
+    return rows, page, page_label(page, len(positions))
+
+
+def pager(label=None, search=False):
+    """Previous / Next buttons, the page label and the store holding the current page
+
+    With search, a "table-search" store also holds the applied search term.
+    """
+    return html.Div([
+        dcc.Store(id="table-page", data=0),
+        *([dcc.Store(id="table-search", data=None)] if search else []),
+        html.Button("◀ Previous", id="page-prev", style=pager_button_style),
+        html.Span(label, id="page-label", style={'margin': '0 15px', 'color': '#555'}),
+        html.Button("Next ▶", id="page-next", style=pager_button_style),
+    ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'margin': '15px 0'})
+
+
+class TableCache:
+    """Thread-safe LRU cache of built table rows"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Return the rows cached for key, building and caching them with build() on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        rows = build()
+        with self._lock:
+            self._entries[key] = rows
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# One cache shared by all sub-apps in a process
+tables = TableCache(TABLE_CACHE_ENTRIES)
+
+
+def cached_rows(key, build):
+    """Rows for key, e.g. (dataset, version, "main", search term), built once per key"""
+    return tables.get_or_build(key, build)
@@ -18,6 +18,7 @@ def check_dependencies():
         'dash',
         'dash-bootstrap-components',
         'pandas',
+        'pyarrow',
         'plotly',
         'shapely',
         'pillow',
@@ -44,6 +45,7 @@ def check_files():
     """Check if all required files exist"""
     required_files = [
         'main_app_ec2.py',
+        'data_store.py',
         'enhanced-location-dashboard.py',
         'classified_response_summay.py',
         'conceptual_classified_responses.py',
@@ -231,6 +233,7 @@ def run_production_mode():
         subprocess.run([
             "gunicorn", 
             "--workers", "3", 
+            "--preload",
             "--bind", "0.0.0.0:8050", 
             "main_app_ec2:server"
         ], check=True, env=os.environ)
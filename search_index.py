@@ -0,0 +1,129 @@
+"""
+Indexes for the main-table search boxes
+---------------------------------------
+SubstringIndex matches a term anywhere in a column, ignoring case. Instead
+of scanning every row per search, every distinct value is broken into its
+1-, 2- and 3-character n-grams once, when the dataset is loaded. Terms of
+up to three characters are answered by a single lookup; longer terms
+intersect the postings of their trigrams and only the few values left are
+checked with a plain substring test.
+
+PrefixIndex searches a plus code column by prefix. Plus codes are
+hierarchical, so a prefix such as 85QFMC is a cell and its matches are the
+locations inside it: one contiguous range of the sorted codes, found by
+bisection in O(log n). The same sorted codes roll counts up to any prefix
+length for an area summary.
+"""
+
+import numpy as np
+import pandas as pd
+
+import plus_codes
+
+# Longest n-gram kept in the index
+MAX_GRAM = 3
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SubstringIndex:
+    """Case-insensitive substring search over some columns of a table; results are row positions"""
+
+    def __init__(self, frame, columns):
+        self.size = len(frame)
+        values = {}
+        rows = []
+        for column in columns:
+            for position, value in enumerate(frame[column].to_numpy(dtype=object)):
+                if not isinstance(value, str):
+                    continue
+                text = value.lower()
+                if text not in values:
+                    values[text] = len(values)
+                    rows.append([])
+                rows[values[text]].append(position)
+        self.values = list(values)
+        self.rows = [np.unique(positions) for positions in rows]
+
+        postings = {}
+        for value_id, text in enumerate(self.values):
+            for n in range(1, MAX_GRAM + 1):
+                for gram in _grams(text, n):
+                    postings.setdefault(gram, []).append(value_id)
+        self.postings = {gram: np.asarray(ids) for gram, ids in postings.items()}
+
+    def _matching_values(self, term):
+        if len(term) <= MAX_GRAM:
+            return self.postings.get(term, np.empty(0, dtype=np.intp))
+        lists = sorted((self.postings.get(gram) for gram in _grams(term, MAX_GRAM)),
+                       key=lambda ids: -1 if ids is None else len(ids))
+        if lists[0] is None:
+            return np.empty(0, dtype=np.intp)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        # Trigrams can all occur without the term itself; confirm the survivors
+        return [value_id for value_id in candidates if term in self.values[value_id]]
+
+    def search(self, term):
+        """Row positions, in table order, with term in any indexed column; all rows for an empty term"""
+        term = (term or "").lower()
+        if not term:
+            return np.arange(self.size)
+        value_ids = self._matching_values(term)
+        if len(value_ids) == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate([self.rows[value_id] for value_id in value_ids]))
+
+
+def _code_key(code):
+    """Sort key of a plus code: upper case, without the separator; '' if missing"""
+    if not isinstance(code, str):
+        return ""
+    return code.strip().upper().replace(plus_codes.SEPARATOR, "")
+
+
+class PrefixIndex:
+    """Prefix search over a plus code column of a table; results are row positions"""
+
+    def __init__(self, frame, column):
+        keys = np.array([_code_key(code) for code in frame[column].to_numpy(dtype=object)], dtype=str)
+        self.size = len(keys)
+        # Row positions in code order, and the codes in that order
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        # Rows without a code sort first and never match
+        self.start = int(np.searchsorted(self.keys, "", side='right'))
+
+    def range(self, prefix):
+        """(lo, hi) bounds of the codes starting with prefix, in sorted order"""
+        prefix = _code_key(prefix)
+        lo = max(int(np.searchsorted(self.keys, prefix, side='left')), self.start)
+        # Codes are ASCII, so every code with the prefix sorts before prefix + U+FFFF
+        hi = int(np.searchsorted(self.keys, prefix + "\uffff", side='left'))
+        return lo, max(lo, hi)
+
+    def search(self, prefix):
+        """Row positions, in table order, whose code starts with prefix; all rows for an empty prefix"""
+        if not _code_key(prefix):
+            return np.arange(self.size)
+        lo, hi = self.range(prefix)
+        return np.sort(self.order[lo:hi])
+
+    def rollup(self, length, prefix=""):
+        """Locations (distinct codes) and rows per code prefix of the given length
+
+        Only codes under prefix are counted. Returns a DataFrame with the
+        columns prefix, locations and rows, in code order.
+        """
+        lo, hi = self.range(prefix) if _code_key(prefix) else (self.start, self.size)
+        keys = self.keys[lo:hi]
+        cells, rows = np.unique(keys.astype(f"U{length}"), return_counts=True)
+        codes = np.unique(keys)
+        _, locations = np.unique(codes.astype(f"U{length}"), return_counts=True)
+        # Put the separator back for prefixes that reach past it
+        labels = [cell[:plus_codes.SEPARATOR_POSITION] + plus_codes.SEPARATOR + cell[plus_codes.SEPARATOR_POSITION:]
+                  if len(cell) > plus_codes.SEPARATOR_POSITION else cell for cell in cells]
+        return pd.DataFrame({"prefix": labels, "locations": locations, "rows": rows})
@@ -31,7 +31,7 @@ source $APP_DIR/venv/bin/activate
 # Install required Python packages
 echo "Installing Python dependencies..."
 pip install --upgrade pip
-pip install dash dash-bootstrap-components pandas plotly shapely numpy pillow gunicorn
+pip install dash dash-bootstrap-components pandas pyarrow plotly shapely numpy pillow gunicorn
 
 # Set up Nginx for reverse proxy
 echo "Setting up Nginx as a reverse proxy..."
@@ -66,7 +66,9 @@ User=ubuntu
 WorkingDirectory=$APP_DIR
 Environment="PATH=$APP_DIR/venv/bin"
 Environment="EC2_MODE=1"
-ExecStart=$APP_DIR/venv/bin/gunicorn --workers 3 --bind 0.0.0.0:8050 main_app_ec2:server
+# Cut the vector tiles of the survey geometries if they are missing or stale
+ExecStartPre=$APP_DIR/venv/bin/python vector_tiles.py
+ExecStart=$APP_DIR/venv/bin/gunicorn --workers 3 --preload --bind 0.0.0.0:8050 main_app_ec2:server
 
 [Install]
 WantedBy=multi-user.target
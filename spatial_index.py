@@ -0,0 +1,56 @@
+"""
+Spatial index over dataset geometries
+-------------------------------------
+Wraps a shapely STRtree built over the WGS84 "shape" column of a dataset.
+Queries return row positions into the dataset frame, so results can be fed
+straight to frame.take() like the group index in data_store.
+"""
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# Meters per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 111320.0
+
+
+class SpatialIndex:
+    """Bounding-box, point-containment and distance queries over one geometry column"""
+
+    def __init__(self, geometries):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.tree = STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def bbox(self, west, south, east, north):
+        """Row positions of geometries intersecting a lon/lat bounding box"""
+        positions = self.tree.query(shapely.box(west, south, east, north), predicate='intersects')
+        return np.sort(positions)
+
+    def contains_point(self, lon, lat):
+        """Row positions of geometries that contain a lon/lat point"""
+        positions = self.tree.query(shapely.Point(lon, lat), predicate='intersects')
+        return np.sort(positions)
+
+    def within_distance(self, lon, lat, meters):
+        """Row positions of geometries within `meters` of a lon/lat point, nearest first
+
+        Candidates come from the tree using a box of the right size in
+        degrees; exact distances are then measured in a local equirectangular
+        projection around the point, which is accurate at survey scale.
+        """
+        scale_x = METERS_PER_DEGREE * np.cos(np.radians(lat))
+        dlon, dlat = meters / scale_x, meters / METERS_PER_DEGREE
+        candidates = self.tree.query(shapely.box(lon - dlon, lat - dlat, lon + dlon, lat + dlat))
+        if len(candidates) == 0:
+            return candidates
+        local = shapely.transform(
+            self.geometries[candidates],
+            lambda coords: (coords - [lon, lat]) * [scale_x, METERS_PER_DEGREE]
+        )
+        distances = shapely.distance(local, shapely.Point(0, 0))
+        keep = distances <= meters
+        order = np.argsort(distances[keep], kind='stable')
+        return candidates[keep][order]
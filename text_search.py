@@ -0,0 +1,116 @@
+"""
+Full-text search over the survey responses
+------------------------------------------
+Every dataset's free-text columns are tokenized and stemmed once, when the
+dataset is loaded, into a BM25 inverted index: term -> (row positions, term
+frequencies). A query is tokenized the same way and scored against the
+postings of its terms only, so ranking a search touches a few short arrays
+instead of every response.
+
+The stemmer is a light suffix stripper (a small subset of Porter's rules):
+it only has to map "trails", "trail" and "trailing" to the same term, and
+needs no extra package.
+"""
+
+import re
+
+import numpy as np
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words too common in the responses to say anything about them
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could do for
+from had has have how i if in into is it its more my no not of on or our so
+some than that the their them there these they this to too up us very was
+we were what when where which who will with would you your
+""".split())
+
+_WORD = re.compile(r"[^\W_]+")
+
+# Checked in order; the first one that leaves a stem of at least 3 letters wins
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("iveness", "ive"),
+    ("ousness", "ous"), ("ation", "ate"), ("ments", ""), ("ment", ""), ("ness", ""),
+    ("ingly", ""), ("edly", ""), ("ing", ""), ("ed", ""), ("ly", ""),
+)
+
+
+def stem(word):
+    """Light English stemmer: plural, verb and a few derivational endings"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    # Plurals: berries -> berry, trails -> trail, but not grass or bus
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    # running -> runn -> run
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "aeiouslz":
+        word = word[:-1]
+    # bike / bikes / biking -> bik
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lowercased, stemmed terms of a text, without stopwords"""
+    if not isinstance(text, str):
+        return []
+    return [stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """BM25 inverted index over a list of documents; results are document positions"""
+
+    def __init__(self, documents):
+        postings = {}
+        lengths = np.zeros(len(documents), dtype=np.float64)
+        for position, text in enumerate(documents):
+            terms = tokenize(text)
+            lengths[position] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(count)
+        self.size = len(documents)
+        self.lengths = lengths
+        self.average_length = lengths.mean() if self.size and lengths.any() else 1.0
+        self.postings = {
+            term: (np.asarray(rows, dtype=np.intp), np.asarray(counts, dtype=np.float64))
+            for term, (rows, counts) in postings.items()
+        }
+
+    def _idf(self, frequency):
+        return np.log(1 + (self.size - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query, limit=None):
+        """(positions, scores) of the documents matching any query term, best first"""
+        rows, scores = [], []
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            term_rows, counts = self.postings[term]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[term_rows] / self.average_length)
+            rows.append(term_rows)
+            scores.append(self._idf(len(term_rows)) * counts * (BM25_K1 + 1) / (counts + norm))
+        if not rows:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        # Sum the scores per matching document; the cost depends on the postings, not on the collection
+        positions, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores), minlength=len(positions))
+        # Best score first, ties in table order (stable sort)
+        order = np.argsort(-totals, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return positions[order], totals[order]
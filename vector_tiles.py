@@ -0,0 +1,383 @@
+"""
+Offline vector tiles for the survey geometries
+----------------------------------------------
+`python vector_tiles.py` cuts every dataset with a shape column whose tiles
+are missing or stale into Mapbox Vector Tiles (--force cuts them all), and
+refresh_tiles() does the same for one dataset after a data reload. Tiles
+are stored as a directory tree:
+
+    <TILES_DIR>/<dataset>/<z>/<x>/<y>.pbf
+
+Each tile holds one MVT layer per group (see group_layer), so a detail map
+can draw just its own group as a vector source layer and the browser only
+fetches the tiles in view. Tiles are encoded with the small protobuf writer
+below, so no extra package is needed. metadata.json records the source file
+the tiles were cut from; tiles_ready() ignores tiles that no longer match
+the loaded data. register_routes() serves the tiles from a Flask server,
+along with a TileJSON document per dataset: maps load the tiles through it,
+so Mapbox knows the zoom range and overzooms the deepest tiles instead of
+asking for tiles that were never cut.
+"""
+
+import json
+import os
+import shutil
+import struct
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+import numpy as np
+import shapely
+from flask import abort, jsonify, request, send_from_directory
+
+import data_store
+
+# Tiles live next to the data unless DASHBOARD_TILES_DIR says otherwise
+TILES_DIR = os.environ.get(
+    'DASHBOARD_TILES_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.tiles')
+)
+
+# Bump when the tile layout changes
+TILES_VERSION = 1
+
+TILE_MIN_ZOOM = 10
+TILE_MAX_ZOOM = 18
+
+# Tile coordinate space and the margin drawn around each tile, in tile units
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# Groups with at least this many rows are drawn from tiles when they exist
+TILE_MIN_ROWS = 500
+
+TILE_MIME = 'application/vnd.mapbox-vector-tile'
+
+# MVT geometry types and commands
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+
+def group_layer(key):
+    """Name of the MVT layer holding one group, e.g. ("Bike use", "B01") -> "Bike use | B01" """
+    return " | ".join(str(part) for part in key)
+
+
+def tile_path(name, z, x, y):
+    return os.path.join(TILES_DIR, name, str(z), str(x), f"{y}.pbf")
+
+
+# Protobuf wire format, just enough for vector_tile.proto
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _uint_field(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+def _bytes_field(field, data):
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(int(v)) for v in values))
+
+
+def _value(value):
+    """An MVT Value message"""
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode())
+    if isinstance(value, (int, np.integer)):
+        value = int(value)
+        if value >= 0:
+            return _uint_field(5, value)
+        return _uint_field(6, (-value << 1) - 1)
+    return _varint(3 << 3 | 1) + struct.pack('<d', float(value))
+
+
+# Geometry encoding
+
+def _zigzag(values):
+    return np.where(values >= 0, values * 2, -values * 2 - 1)
+
+
+def _dedupe(coords):
+    """Drop repeated consecutive vertices, which rounding to tile units creates"""
+    if len(coords) == 0:
+        return coords
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(np.diff(coords, axis=0) != 0, axis=1)
+    return coords[keep]
+
+
+def _ring_area(ring):
+    """Signed area of a closed ring; positive means clockwise on screen (y down)"""
+    x, y = ring[:, 0], ring[:, 1]
+    return (np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+
+def _paths(paths, close):
+    """Command integers for a sequence of integer coordinate paths"""
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for path in paths:
+        deltas = np.diff(path, axis=0, prepend=cursor[None, :])
+        commands.append(MOVE_TO | 1 << 3)
+        commands.extend(_zigzag(deltas[0]))
+        commands.append(LINE_TO | (len(path) - 1) << 3)
+        commands.extend(_zigzag(deltas[1:]).ravel())
+        if close:
+            commands.append(CLOSE_PATH | 1 << 3)
+        cursor = path[-1]
+    return commands
+
+
+def _feature_geometry(geom):
+    """(MVT type, command integers) of a geometry in tile units, or None if nothing is left"""
+    type_id = shapely.get_type_id(geom)
+    parts = shapely.get_parts(geom)
+    if type_id in (0, 4):
+        coords = shapely.get_coordinates(parts).astype(np.int64)
+        if len(coords) == 0:
+            return None
+        deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        return POINT, [MOVE_TO | len(coords) << 3, *_zigzag(deltas).ravel()]
+    if type_id in (1, 5):
+        lines = [_dedupe(shapely.get_coordinates(line).astype(np.int64)) for line in parts]
+        lines = [line for line in lines if len(line) >= 2]
+        return (LINESTRING, _paths(lines, close=False)) if lines else None
+    if type_id in (3, 6):
+        rings = []
+        for polygon in parts:
+            for i, ring in enumerate(shapely.get_rings(polygon)):
+                coords = _dedupe(shapely.get_coordinates(ring).astype(np.int64))
+                if len(coords) < 4:
+                    if i == 0:
+                        break
+                    continue
+                area = _ring_area(coords)
+                if area == 0:
+                    if i == 0:
+                        break
+                    continue
+                # Exterior rings must be clockwise on screen, holes counter-clockwise
+                if (area > 0) != (i == 0):
+                    coords = coords[::-1]
+                # The closing vertex is implied by ClosePath
+                rings.append(coords[:-1])
+        return (POLYGON, _paths(rings, close=True)) if rings else None
+    return None
+
+
+def _layer(name, features):
+    """An MVT Layer message from (id, type, geometry, properties) features"""
+    keys = {}
+    values = {}
+    encoded = []
+    for feature_id, geom_type, geometry, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        encoded.append(_bytes_field(2, b''.join([
+            _uint_field(1, feature_id),
+            _packed_field(2, tags),
+            _uint_field(3, geom_type),
+            _packed_field(4, geometry),
+        ])))
+    return b''.join([
+        _uint_field(15, 2),
+        _bytes_field(1, name.encode()),
+        *encoded,
+        *(_bytes_field(3, key.encode()) for key in keys),
+        *(_bytes_field(4, _value(value)) for _, value in values),
+        _uint_field(5, TILE_EXTENT),
+    ])
+
+
+def _to_mercator(coords):
+    """WGS84 lon/lat to Web Mercator in [0, 1] world units, y growing southwards"""
+    x = (coords[:, 0] + 180) / 360
+    lat = np.radians(np.clip(coords[:, 1], -85.05112878, 85.05112878))
+    y = (1 - np.log(np.tan(np.pi / 4 + lat / 2)) / np.pi) / 2
+    return np.column_stack([x, y])
+
+
+def build_tiles(name):
+    """Cut one dataset into tiles for every zoom level; returns the number of tiles written"""
+    dataset = data_store.get_dataset(name)
+    if dataset.spatial is None:
+        return 0
+    spec = data_store.DATASETS[name]
+    olcs = dataset.frame[spec["olc_column"]].to_numpy() if spec.get("olc_column") else None
+    layers = np.full(len(dataset.frame), None, dtype=object)
+    grouped = np.zeros(len(dataset.frame), dtype=bool)
+    for key, positions in dataset.groups.items():
+        layers[positions] = group_layer(key)
+        grouped[positions] = True
+
+    out_dir = os.path.join(TILES_DIR, name)
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    count = 0
+    for z in range(TILE_MIN_ZOOM, TILE_MAX_ZOOM + 1):
+        scale = 2 ** z
+        shapes = shapely.transform(dataset.shapes_for_zoom(z), _to_mercator)
+        present = np.flatnonzero(~shapely.is_missing(shapes) & grouped)
+        # Tiles covered by each geometry, buffer included
+        margin = TILE_BUFFER / TILE_EXTENT
+        bounds = shapely.bounds(shapes[present]) * scale
+        first = np.floor(bounds[:, :2] - margin).astype(np.int64).clip(0, scale - 1)
+        last = np.floor(bounds[:, 2:] + margin).astype(np.int64).clip(0, scale - 1)
+        tiles = {}
+        for row, (x0, y0), (x1, y1) in zip(present, first, last):
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    tiles.setdefault((x, y), []).append(row)
+
+        for (x, y), rows in tiles.items():
+            rows = np.asarray(rows)
+            box = ((x - margin) / scale, (y - margin) / scale, (x + 1 + margin) / scale, (y + 1 + margin) / scale)
+            clipped = shapely.clip_by_rect(shapes[rows], *box)
+            local = shapely.transform(
+                clipped, lambda coords: np.round((coords * scale - [x, y]) * TILE_EXTENT))
+            by_layer = {}
+            for row, geom in zip(rows, local):
+                if geom is None or shapely.is_empty(geom):
+                    continue
+                encoded = _feature_geometry(geom)
+                if encoded is None:
+                    continue
+                properties = {"row": int(row)}
+                if olcs is not None and isinstance(olcs[row], str):
+                    properties["olc"] = olcs[row]
+                by_layer.setdefault(layers[row], []).append((int(row), *encoded, properties))
+            if not by_layer:
+                continue
+            path = os.path.join(tmp_dir, str(z), str(x), f"{y}.pbf")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b''.join(_bytes_field(3, _layer(layer, features)) for layer, features in by_layer.items()))
+            count += 1
+
+    west, south, east, north = shapely.total_bounds(dataset.frame["shape"].to_numpy())
+    os.makedirs(tmp_dir, exist_ok=True)
+    with open(os.path.join(tmp_dir, "metadata.json"), 'w') as f:
+        json.dump({
+            "version": TILES_VERSION,
+            "source": list(dataset.source_stat or []),
+            "minzoom": TILE_MIN_ZOOM,
+            "maxzoom": TILE_MAX_ZOOM,
+            "bounds": [west, south, east, north],
+            "tiles": count,
+        }, f)
+
+    # Swap the new tree in; readers see either the old or the new tiles
+    old_dir = f"{out_dir}.{os.getpid()}.old"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return count
+
+
+def tiles_ready(dataset):
+    """True if the tiles on disk were cut from the data currently loaded for the dataset"""
+    try:
+        with open(os.path.join(TILES_DIR, dataset.name, "metadata.json")) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return metadata.get("version") == TILES_VERSION and tuple(metadata.get("source", ())) == dataset.source_stat
+
+
+def refresh_tiles(dataset):
+    """Cut the tiles of a dataset unless they already match its data; returns the number written
+
+    Meant to run after a data reload. Every worker reloads on its own, so
+    builds take a lock file and the first one does the work.
+    """
+    if dataset.spatial is None or tiles_ready(dataset):
+        return 0
+    os.makedirs(TILES_DIR, exist_ok=True)
+    with open(os.path.join(TILES_DIR, f"{dataset.name}.lock"), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another worker may have cut them while this one waited
+        if tiles_ready(data_store.get_dataset(dataset.name)):
+            return 0
+        return build_tiles(dataset.name)
+
+
+def use_tiles(dataset, positions):
+    """Whether a group is big enough to draw from tiles, and tiles are available"""
+    return len(positions) >= TILE_MIN_ROWS and tiles_ready(dataset)
+
+
+def tile_url(name, root="/"):
+    """Tile URL template of a dataset"""
+    return f"{root}tiles/{name}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def tilejson_url(name, root="/"):
+    """URL of a dataset's TileJSON, for a mapbox vector source"""
+    return f"{root}tiles/{name}.json"
+
+
+def tilejson(name, root="/"):
+    """TileJSON of a dataset's tiles, from their metadata.json, or None if there are none"""
+    try:
+        with open(os.path.join(TILES_DIR, name, "metadata.json")) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {
+        "tilejson": "2.2.0",
+        "scheme": "xyz",
+        "tiles": [tile_url(name, root)],
+        "minzoom": metadata["minzoom"],
+        "maxzoom": metadata["maxzoom"],
+        "bounds": metadata["bounds"],
+    }
+
+
+def register_routes(server):
+    """Serve the tiles from a Flask server at /tiles/<dataset>/<z>/<x>/<y>.pbf, and their TileJSON at /tiles/<dataset>.json"""
+    @server.route("/tiles/<name>.json")
+    def vector_tilejson(name):
+        document = tilejson(name, request.host_url) if name in data_store.DATASETS else None
+        if document is None:
+            abort(404)
+        return jsonify(document)
+
+    @server.route("/tiles/<name>/<int:z>/<int:x>/<int:y>.pbf")
+    def vector_tile(name, z, x, y):
+        if name not in data_store.DATASETS:
+            abort(404)
+        path = tile_path(name, z, x, y)
+        # Tiles without any geometry are not written
+        if not os.path.exists(path):
+            return '', 204
+        return send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype=TILE_MIME, max_age=3600)
+
+
+if __name__ == "__main__":
+    # Cut missing or stale tiles of every dataset with geometries: python vector_tiles.py [--force]
+    force = "--force" in sys.argv[1:]
+    for name in data_store.DATASETS:
+        dataset = data_store.get_dataset(name)
+        count = build_tiles(name) if force else refresh_tiles(dataset)
+        print(f"{name:<24} {count} tiles")